@@ -0,0 +1,142 @@
+import argparse
+import random
+import sys
+
+import degrees
+from graph import Graph
+from landmarks import LandmarkIndex
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; memory is then left out of the report
+    resource = None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        usage="python benchmark.py [directory] [--synthetic PEOPLE]"
+    )
+    parser.add_argument("directory", nargs="?", default="large")
+    parser.add_argument("--synthetic", type=int, metavar="PEOPLE",
+                        help="benchmark a generated scale-free graph instead")
+    parser.add_argument("--queries", type=int, default=100,
+                        help="random source/target pairs per engine")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed for the graph and the query pairs")
+    parser.add_argument("--engines", nargs="+", choices=degrees.ENGINES,
+                        default=list(degrees.ENGINES))
+    parser.add_argument("--landmarks", type=int, default=8, metavar="K",
+                        help="landmarks built for the astar engine if none are loaded")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        print(f"Generating {args.synthetic} people...")
+        degrees.graph = synthetic_graph(args.synthetic, args.seed)
+    else:
+        print("Loading data...")
+        degrees.load_data(args.directory)
+    if "astar" in args.engines and degrees.landmarks is None:
+        print(f"Building {args.landmarks} landmarks...")
+        degrees.landmarks = LandmarkIndex.build(degrees.graph, args.landmarks)
+
+    graph = degrees.graph
+    print(f"{graph.num_people()} people, {graph.num_movies()} movies, "
+          f"{len(graph.person_movies)} stars")
+    pairs = random_pairs(graph, args.queries, args.seed)
+
+    answers = {}
+    for engine in args.engines:
+        results = run(engine, pairs)
+        answers[engine] = [stats["degrees"] for stats in results]
+        report(engine, results)
+
+    reference = answers[args.engines[0]]
+    for engine in args.engines[1:]:
+        disagree = sum(a != b for a, b in zip(reference, answers[engine]))
+        if disagree:
+            sys.exit(f"{engine} disagrees with {args.engines[0]} on {disagree} queries")
+
+
+def synthetic_graph(num_people, seed, cast_size=4, attachment=0.5):
+    """
+    Generate a scale-free star graph with about one credit per person.
+
+    Each movie casts `cast_size` people. With probability `attachment` a
+    cast member is an existing credit's person picked at random, so
+    people are picked in proportion to the movies they are already in,
+    and otherwise anyone picked uniformly.
+    """
+    rng = random.Random(seed)
+    num_movies = max(1, num_people // cast_size)
+    credits = []
+    edges = []
+    for movie in range(num_movies):
+        for _ in range(cast_size):
+            if credits and rng.random() < attachment:
+                person = rng.choice(credits)
+            else:
+                person = rng.randrange(num_people)
+            credits.append(person)
+            edges.append((str(person), str(movie)))
+    return Graph.from_edges(
+        (str(person) for person in range(num_people)),
+        (str(movie) for movie in range(num_movies)),
+        edges
+    )
+
+
+def random_pairs(graph, n, seed):
+    """
+    Return `n` reproducible (source, target) pairs of person_ids, drawn
+    from people who starred in at least one movie.
+    """
+    rng = random.Random(seed)
+    cast = [person for person in range(graph.num_people()) if graph.degree(person)]
+    return [
+        (graph.person_ids[rng.choice(cast)], graph.person_ids[rng.choice(cast)])
+        for _ in range(n)
+    ]
+
+
+def run(engine, pairs):
+    """
+    Run shortest_path with `engine` on every pair, returning the search
+    counters collected through degrees.search_hook.
+    """
+    results = []
+    degrees.search_hook = results.append
+    try:
+        for source, target in pairs:
+            degrees.shortest_path(source, target, engine)
+    finally:
+        degrees.search_hook = None
+    return results
+
+
+def report(engine, results):
+    times = sorted(stats["seconds"] for stats in results)
+    expanded = [stats["expanded"] for stats in results]
+    peaks = [stats["frontier_peak"] for stats in results]
+    print(f"{engine}:")
+    print(f"  expanded: mean {sum(expanded) / len(expanded):.0f}, max {max(expanded)}")
+    print(f"  frontier peak: mean {sum(peaks) / len(peaks):.0f}, max {max(peaks)}")
+    print("  seconds: " + ", ".join(
+        f"p{q} {percentile(times, q):.4f}" for q in (50, 90, 99)
+    ) + f", total {sum(times):.2f}")
+    if resource is not None:
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        scale = 1 if sys.platform == "darwin" else 1024
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+        print(f"  memory high-water mark: {peak / 2 ** 20:.0f} MB")
+
+
+def percentile(ordered, q):
+    """
+    Return the q-th percentile of a sorted list, nearest rank.
+    """
+    return ordered[min(len(ordered) - 1, max(0, -(-q * len(ordered) // 100) - 1))]
+
+
+if __name__ == "__main__":
+    main()
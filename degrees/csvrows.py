@@ -0,0 +1,61 @@
+import csv
+
+
+def read_columns(filename, columns):
+    """
+    Yield the values of the named `columns` for each data row of a CSV
+    file, one row at a time.
+    """
+    with open(filename, encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        indexes = [header.index(column) for column in columns]
+        for row in reader:
+            yield [row[i] for i in indexes]
+
+
+def read_offsets(filename, columns):
+    """
+    Like read_columns, but also append the byte offset each row starts at
+    to the yielded values, so the row can be read again with CsvColumn.
+    """
+    with open(filename, "rb") as f:
+        end = 0
+
+        def lines():
+            nonlocal end
+            for line in f:
+                end += len(line)
+                yield line.decode("utf-8")
+
+        # The reader only pulls the lines it needs, so `end` is always the
+        # offset of the row after the one just read
+        reader = csv.reader(lines())
+        header = next(reader)
+        indexes = [header.index(column) for column in columns]
+        start = end
+        for row in reader:
+            yield [row[i] for i in indexes] + [start]
+            start = end
+
+
+class CsvColumn():
+    """
+    Read-only sequence of one column of a CSV file, where item i is read
+    from disk on access starting at byte offset `offsets[i]`.
+    """
+
+    def __init__(self, filename, offsets, column):
+        self.filename = filename
+        self.offsets = offsets
+        with open(filename, encoding="utf-8", newline="") as f:
+            self.index = next(csv.reader(f)).index(column)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, i):
+        with open(self.filename, "rb") as f:
+            f.seek(self.offsets[i])
+            row = next(csv.reader(line.decode("utf-8") for line in f))
+        return row[self.index]
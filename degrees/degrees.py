@@ -1,66 +1,293 @@
-import csv
+import argparse
+import heapq
+import multiprocessing
+import os
 import sys
+import time
+from array import array
+from collections import OrderedDict
 
+import snapshot
+from csvrows import CsvColumn, read_columns, read_offsets
+from graph import Graph
+from landmarks import LandmarkIndex
+from nameindex import NameIndex
 from util import Node, StackFrontier, QueueFrontier
 
-# Maps names to a set of corresponding person_ids
+# Maps lowercase names to a set of corresponding person_ids
 names = {}
 
-# Maps person_ids to a dictionary of: name, birth, movies (a set of movie_ids)
+# Maps person_ids to a dictionary of: name, birth
 people = {}
 
-# Maps movie_ids to a dictionary of: title, year, stars (a set of person_ids)
+# Maps movie_ids to a dictionary of: title, year
 movies = {}
 
+# Graph of who starred in what, built by load_data
+graph = None
 
-def load_data(directory):
+# Landmark distances, if the directory has an up to date landmark index
+landmarks = None
+
+# Search engines understood by shortest_path
+ENGINES = ("bfs", "bidirectional", "astar")
+
+# If set, called after every shortest_path search with a dictionary of
+# counters: engine, expanded, frontier_peak, seconds and degrees
+search_hook = None
+
+# Snapshot written next to the CSV files by --build-index
+INDEX_FILE = "degrees.idx"
+# Layout of the snapshot's sections, bumped whenever build_index changes them
+INDEX_VERSION = 2
+SOURCE_FILES = ("people.csv", "movies.csv", "stars.csv")
+
+# Landmark index written next to the CSV files by --build-landmarks
+LANDMARK_FILE = "landmarks.idx"
+
+# Number of per-source search trees kept by batch mode, each taking
+# at most 12 bytes per person (see SearchTree)
+CACHE_SIZE = 32
+
+# Queries handed to a worker process at a time
+CHUNK_SIZE = 64
+
+# Search trees of the current batch, one cache per process
+trees = None
+
+
+def load_data(directory, use_index=True):
+    """
+    Load data into memory, from the directory's snapshot if an up to date
+    one exists and from the CSV files otherwise. An up to date landmark
+    index is loaded as well. A snapshot written by another version of
+    build_index, or missing any section, is treated as out of date.
+    """
+    global landmarks
+
+    loaded = False
+    if use_index:
+        try:
+            sections, metadata = snapshot.load(os.path.join(directory, INDEX_FILE))
+        except (OSError, ValueError):
+            pass
+        else:
+            if (metadata.get("version") == INDEX_VERSION
+                    and metadata.get("sources") == source_stamps(directory)):
+                try:
+                    load_sections(sections)
+                    loaded = True
+                except KeyError:
+                    pass
+    if not loaded:
+        load_csv(directory)
+
+    landmarks = None
+    try:
+        index, metadata = LandmarkIndex.load(os.path.join(directory, LANDMARK_FILE))
+    except (OSError, ValueError):
+        pass
+    else:
+        if metadata["sources"] == source_stamps(directory):
+            landmarks = index
+
+
+def load_csv(directory):
     """
     Load data from CSV files into memory.
+
+    Only what searching needs is kept in memory: ids, the name index and
+    the star graph, with stars streamed straight into the graph's arrays.
+    Display fields are read back from the CSV files when looked up.
     """
+    global graph, names, people, movies
+
+    people_file = f"{directory}/people.csv"
+    movies_file = f"{directory}/movies.csv"
+
     # Load people
-    with open(f"{directory}/people.csv", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            people[row["id"]] = {
-                "name": row["name"],
-                "birth": row["birth"],
-                "movies": set()
-            }
-            if row["name"].lower() not in names:
-                names[row["name"].lower()] = {row["id"]}
-            else:
-                names[row["name"].lower()].add(row["id"])
+    rows = sorted(read_offsets(people_file, ["id", "name"]))
+    person_ids = [person_id for person_id, _, _ in rows]
+    person_names = [name for _, name, _ in rows]
+    person_offsets = array("q", [offset for _, _, offset in rows])
 
     # Load movies
-    with open(f"{directory}/movies.csv", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            movies[row["id"]] = {
-                "title": row["title"],
-                "year": row["year"],
-                "stars": set()
-            }
+    rows = sorted(read_offsets(movies_file, ["id"]))
+    movie_ids = [movie_id for movie_id, _ in rows]
+    movie_offsets = array("q", [offset for _, offset in rows])
+    del rows
 
     # Load stars
-    with open(f"{directory}/stars.csv", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            try:
-                people[row["person_id"]]["movies"].add(row["movie_id"])
-                movies[row["movie_id"]]["stars"].add(row["person_id"])
-            except KeyError:
-                pass
+    edges = read_columns(f"{directory}/stars.csv", ["person_id", "movie_id"])
+    graph = Graph.from_edges(person_ids, movie_ids, edges)
+
+    names = NameIndex.build(person_names, graph.person_ids)
+    people = snapshot.Records(graph.person_ids,
+                              name=CsvColumn(people_file, person_offsets, "name"),
+                              birth=CsvColumn(people_file, person_offsets, "birth"))
+    movies = snapshot.Records(graph.movie_ids,
+                              title=CsvColumn(movies_file, movie_offsets, "title"),
+                              year=CsvColumn(movies_file, movie_offsets, "year"))
+
+
+def source_stamps(directory):
+    """
+    Return the size and modification time of each CSV file, used to tell
+    whether a snapshot still matches the data it was built from.
+    """
+    stamps = {}
+    for filename in SOURCE_FILES:
+        stat = os.stat(os.path.join(directory, filename))
+        stamps[filename] = [stat.st_size, stat.st_mtime_ns]
+    return stamps
+
+
+def build_index(directory):
+    """
+    Parse the CSV files in `directory` and write them to a snapshot that
+    later calls to load_data will memory-map instead.
+    """
+    load_data(directory, use_index=False)
+    person_names, person_births = read_fields(
+        f"{directory}/people.csv", graph.person_ids, ["name", "birth"]
+    )
+    movie_titles, movie_years = read_fields(
+        f"{directory}/movies.csv", graph.movie_ids, ["title", "year"]
+    )
+    trigrams, trigram_offsets, trigram_entries = names.trigrams
+    sections = {
+        "person_ids": graph.person_ids,
+        "person_names": person_names,
+        "person_births": person_births,
+        "movie_ids": graph.movie_ids,
+        "movie_titles": movie_titles,
+        "movie_years": movie_years,
+        "person_offsets": graph.person_offsets,
+        "person_movies": graph.person_movies,
+        "movie_offsets": graph.movie_offsets,
+        "movie_stars": graph.movie_stars,
+        "name_keys": names.keys_table,
+        "name_people": names.people,
+        "trigrams": trigrams,
+        "trigram_offsets": trigram_offsets,
+        "trigram_entries": trigram_entries
+    }
+    metadata = {
+        "version": INDEX_VERSION,
+        "sources": source_stamps(directory),
+        "people": graph.num_people(),
+        "movies": graph.num_movies(),
+        "stars": len(graph.person_movies)
+    }
+    filename = os.path.join(directory, INDEX_FILE)
+    snapshot.save(filename, sections, metadata)
+    return filename
+
+
+def read_fields(filename, ids, columns):
+    """
+    Read the named `columns` of a CSV file in one pass, returning a list
+    per column aligned with `ids`.
+    """
+    rows = {row[0]: row[1:] for row in read_columns(filename, ["id"] + columns)}
+    return [[rows[row_id][i] for row_id in ids] for i in range(len(columns))]
+
+
+def build_landmarks(directory, k):
+    """
+    Search from the `k` people with the most movies and save their
+    distances to everyone, for distance_estimate and the "astar" engine.
+    """
+    global landmarks
+
+    load_data(directory)
+    landmarks = LandmarkIndex.build(graph, k)
+    filename = os.path.join(directory, LANDMARK_FILE)
+    landmarks.save(filename, {"sources": source_stamps(directory)})
+    return filename
+
+
+def load_sections(sections):
+    """
+    Point the module's lookup tables at the sections of a loaded snapshot.
+    """
+    global graph, names, people, movies
+
+    graph = Graph(sections["person_ids"], sections["movie_ids"],
+                  sections["person_offsets"], sections["person_movies"],
+                  sections["movie_offsets"], sections["movie_stars"])
+    people = snapshot.Records(graph.person_ids,
+                              name=sections["person_names"],
+                              birth=sections["person_births"])
+    movies = snapshot.Records(graph.movie_ids,
+                              title=sections["movie_titles"],
+                              year=sections["movie_years"])
+    names = NameIndex(sections["name_keys"], sections["name_people"], graph.person_ids,
+                      (sections["trigrams"], sections["trigram_offsets"],
+                       sections["trigram_entries"]))
+
 
 def main():
-    if len(sys.argv) > 2:
-        sys.exit("Usage: python degrees.py [directory]")
-    directory = sys.argv[1] if len(sys.argv) == 2 else "large"
+    parser = argparse.ArgumentParser(usage="python degrees.py [directory]")
+    parser.add_argument("directory", nargs="?", default="large")
+    parser.add_argument("--engine", choices=ENGINES, default="bidirectional",
+                        help="search engine used by shortest_path")
+    parser.add_argument("--build-index", action="store_true",
+                        help=f"write {INDEX_FILE} for faster loading and exit")
+    parser.add_argument("--build-landmarks", type=int, metavar="K",
+                        help=f"write {LANDMARK_FILE} with K landmarks and exit")
+    parser.add_argument("--search", metavar="NAME",
+                        help="list people whose names start with or resemble NAME")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="answer tab separated name pairs from FILE (- for stdin)")
+    parser.add_argument("--cache-size", type=int, default=CACHE_SIZE,
+                        help="search trees kept between batch queries")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="worker processes answering batch queries")
+    parser.add_argument("--histogram", metavar="NAME",
+                        help="print how many people are each distance from NAME")
+    args = parser.parse_args()
+
+    if args.build_index:
+        print("Building index...")
+        print(f"Index written to {build_index(args.directory)}.")
+        return
+
+    if args.build_landmarks:
+        print("Building landmarks...")
+        print(f"Landmarks written to {build_landmarks(args.directory, args.build_landmarks)}.")
+        return
+
+    if args.batch:
+        load_data(args.directory)
+        if args.batch == "-":
+            run_batch(sys.stdin, sys.stdout, args.cache_size, args.directory, args.workers)
+        else:
+            with open(args.batch, encoding="utf-8") as f:
+                run_batch(f, sys.stdout, args.cache_size, args.directory, args.workers)
+        return
 
     # Load data from files into memory
     print("Loading data...")
-    load_data(directory)
+    load_data(args.directory)
     print("Data loaded.")
 
+    if args.search:
+        for person_id in search_people(args.search):
+            person = people[person_id]
+            print(f"ID: {person_id}, Name: {person['name']}, Birth: {person['birth']}")
+        return
+
+    if args.histogram:
+        source = person_id_for_name(args.histogram)
+        if source is None:
+            sys.exit("Person not found.")
+        histogram = distance_histogram(source)
+        for degrees, count in enumerate(histogram):
+            print(f"{degrees}: {count}")
+        print(f"Not connected: {graph.num_people() - sum(histogram)}")
+        return
+
     source = person_id_for_name(input("Name: "))
     if source is None:
         sys.exit("Person not found.")
@@ -68,7 +295,7 @@ def main():
     if target is None:
         sys.exit("Person not found.")
 
-    path = shortest_path(source, target)
+    path = shortest_path(source, target, args.engine)
 
     if path is None:
         print("Not connected.")
@@ -82,43 +309,403 @@ def main():
             movie = movies[path[i + 1][0]]["title"]
             print(f"{i + 1}: {person1} and {person2} starred in {movie}")
 
-def shortest_path(source, target):
+
+def run_batch(lines, out, cache_size=CACHE_SIZE, directory=None, workers=1):
+    """
+    Answer one query per line of `lines`, each a source and target name
+    separated by a tab, writing a line to `out` as each is answered.
+
+    Result lines repeat the two names followed by the degrees of
+    separation, "not connected", or why a name could not be resolved.
+    Search trees are shared between queries with the same source. With
+    more than one worker, queries are spread over a process pool that
+    shares the loaded data; results are still written in input order.
+    """
+    global trees
+
+    trees = TreeCache(cache_size)
+    queries = (line.rstrip("\n") for line in lines if line.strip())
+    if workers > 1:
+        with worker_pool(directory, workers, cache_size) as pool:
+            for result in pool.imap(answer_query, queries, CHUNK_SIZE):
+                out.write(result)
+                out.flush()
+    else:
+        for query in queries:
+            out.write(answer_query(query))
+            out.flush()
+
+
+def answer_query(query):
+    """
+    Return the batch result line for one tab separated query.
+    """
+    source_name, _, target_name = query.partition("\t")
+    source = batch_person(source_name)
+    target = batch_person(target_name)
+    if not isinstance(source, int):
+        result = source
+    elif not isinstance(target, int):
+        result = target
+    else:
+        path = trees.path(source, target)
+        result = "not connected" if path is None else str(len(path))
+    return f"{source_name}\t{target_name}\t{result}\n"
+
+
+def worker_pool(directory, workers, cache_size=CACHE_SIZE):
+    """
+    Return a process pool whose workers can answer queries on the data.
+
+    Forked workers share the parent's loaded graph copy-on-write (and a
+    snapshot's mapped pages directly); workers started any other way load
+    `directory` themselves.
+    """
+    return multiprocessing.Pool(workers, initializer=init_worker,
+                                initargs=(directory, cache_size))
+
+
+def init_worker(directory, cache_size):
+    global trees
+
+    if graph is None:
+        load_data(directory)
+    trees = TreeCache(cache_size)
+
+
+def parallel_paths(pairs, directory, workers, engine="bidirectional"):
+    """
+    Yield shortest_path for each (source, target) person_id pair, in
+    order, computed across `workers` processes.
+    """
+    with worker_pool(directory, workers) as pool:
+        queries = ((source, target, engine) for source, target in pairs)
+        yield from pool.imap(pool_shortest_path, queries, CHUNK_SIZE)
+
+
+def pool_shortest_path(query):
+    return shortest_path(*query)
+
+
+def batch_person(name):
+    """
+    Return the person number for `name`, or a description of why it
+    could not be resolved without asking.
+    """
+    person_ids = names.get(name.lower(), set())
+    if len(person_ids) == 0:
+        return f"not found: {name}"
+    if len(person_ids) > 1:
+        return f"ambiguous: {name}"
+    return graph.person_index(next(iter(person_ids)))
+
+
+class SearchTree():
+    """
+    Breadth-first search tree from one source person, grown on demand.
+
+    The tree is only expanded until the targets asked for so far are
+    reached, so later queries from the same source pick up where the last
+    one stopped. Works on dense person numbers of `graph`.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        # Movie and person one step closer to the source, by person
+        # number, so a tree costs 4 bytes per person in each array however
+        # far it has grown. Unreached people have parent_person -1
+        self.parent_movie = array("i", [-1]) * graph.num_people()
+        self.parent_person = array("i", [-1]) * graph.num_people()
+        self.parent_person[source] = source
+        # People in the order they were reached, those not yet expanded
+        # being frontier[head:]
+        self.frontier = array("i", [source])
+        self.head = 0
+
+    def path_to(self, target):
+        """
+        Return the shortest (movie, person) path to `target`, or None.
+        """
+        parent_movie, parent_person, frontier = self.parent_movie, self.parent_person, self.frontier
+        head = self.head
+        while parent_person[target] == -1 and head < len(frontier):
+            person = frontier[head]
+            head += 1
+            for movie, neighbor in graph.neighbors(person):
+                if parent_person[neighbor] == -1:
+                    parent_movie[neighbor] = movie
+                    parent_person[neighbor] = person
+                    frontier.append(neighbor)
+        self.head = head
+        if parent_person[target] == -1:
+            return None
+
+        output = []
+        while target != self.source:
+            output.append((parent_movie[target], target))
+            target = parent_person[target]
+        output.reverse()
+        return output
+
+
+class TreeCache():
+    """
+    Least recently used cache of SearchTrees keyed by source person.
+    """
+
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self.trees = OrderedDict()
+
+    def path(self, source, target):
+        tree = self.trees.get(source)
+        if tree is None:
+            tree = SearchTree(source)
+            self.trees[source] = tree
+            if len(self.trees) > self.size:
+                self.trees.popitem(last=False)
+        else:
+            self.trees.move_to_end(source)
+        return tree.path_to(target)
+
+
+def shortest_path(source, target, engine="bidirectional"):
     """
     Returns the shortest list of (movie_id, person_id) pairs
     that connect the source to the target.
 
-    If no possible path, returns None.
+    `engine` picks the search: "bfs" expands a single frontier from the
+    source, "bidirectional" grows frontiers from both ends and stops
+    where they meet, and "astar" is guided by landmark distance bounds
+    (see build_landmarks).
+
+    If no possible path, returns None. Counters for the search are passed
+    to `search_hook` when one is set.
     """
+    if engine == "bfs":
+        search = breadth_first_path
+    elif engine == "bidirectional":
+        search = bidirectional_path
+    elif engine == "astar":
+        search = astar_path
+    else:
+        raise ValueError(f"unknown engine: {engine}")
+    stats = {"engine": engine, "expanded": 0, "frontier_peak": 0}
+    start = time.perf_counter()
+    path = search(graph.person_index(source), graph.person_index(target), stats)
+    stats["seconds"] = time.perf_counter() - start
+    stats["degrees"] = None if path is None else len(path)
+    if search_hook is not None:
+        search_hook(stats)
+
+    if path is None:
+        return None
+    return [(graph.movie_ids[movie], graph.person_ids[person]) for movie, person in path]
+
 
+def breadth_first_path(source, target, stats):
+    """
+    Single-frontier breadth-first search from source to target,
+    both given as dense person numbers of `graph`. People expanded and
+    the largest frontier size are counted in `stats`.
+    """
     frontier = QueueFrontier()
     # Node(CurrPersonID, PrevPersonID, ConnectingMovieID)
-    init_Node = Node(source, None, None)
-    frontier.add(init_Node)
-    searched = set() # containing ids of searched individuals
-    while True:
+    frontier.add(Node(source, None, None))
+    searched = {source} # containing ids of searched individuals
+    curr_node = None
+    while curr_node is None:
         if frontier.empty():
             return None
-        curr_node = frontier.remove()
-        searched.add(curr_node.state)
-        if curr_node.state == target:
+        node = frontier.remove()
+        if node.state == target:
+            curr_node = node
             break
-        for MovID, pID in neighbors_for_person(curr_node.state):
-            if pID == target:
-                break
+        stats["expanded"] += 1
+        for MovID, pID in graph.neighbors(node.state):
             if pID in searched:
                 continue
-            frontier.add(Node(pID,curr_node,MovID))
-        if pID == target:
-            break
-    
+            searched.add(pID)
+            child = Node(pID, node, MovID)
+            if pID == target:
+                curr_node = child
+                break
+            frontier.add(child)
+        stats["frontier_peak"] = max(stats["frontier_peak"], len(frontier.frontier))
+
     # Create output
     output = []
     while curr_node.parent is not None:
-        output.insert(0, (curr_node.action, curr_node.state))
+        output.append((curr_node.action, curr_node.state))
         curr_node = curr_node.parent
+    output.reverse()
+    return output
+
+
+def bidirectional_path(source, target, stats):
+    """
+    Breadth-first search from both ends at once.
+
+    Works on dense person numbers of `graph`. Each round expands one
+    whole level of whichever frontier is smaller. Every person reached on
+    that level that the other side has already seen is a meeting point;
+    the level is finished so the shortest of those meetings can be picked.
+    People expanded and the largest combined frontier are counted in
+    `stats`.
+    """
+    if source == target:
+        return []
+
+    # Maps person to (movie, person one step closer to that end)
+    parents = ({source: None}, {target: None})
+    depths = ({source: 0}, {target: 0})
+    frontiers = ([source], [target])
+
+    while frontiers[0] and frontiers[1]:
+        side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+        seen, other = parents[side], parents[1 - side]
+        depth, other_depth = depths[side], depths[1 - side]
+
+        best = None
+        next_frontier = []
+        for person in frontiers[side]:
+            for movie, neighbor in graph.neighbors(person):
+                if neighbor in seen:
+                    continue
+                seen[neighbor] = (movie, person)
+                depth[neighbor] = depth[person] + 1
+                next_frontier.append(neighbor)
+                if neighbor in other:
+                    length = depth[neighbor] + other_depth[neighbor]
+                    if best is None or length < best[0]:
+                        best = (length, neighbor)
+        stats["expanded"] += len(frontiers[side])
+        frontiers = (next_frontier, frontiers[1]) if side == 0 else (frontiers[0], next_frontier)
+        stats["frontier_peak"] = max(stats["frontier_peak"],
+                                     len(frontiers[0]) + len(frontiers[1]))
+
+        if best is not None:
+            return join_paths(parents[0], parents[1], best[1])
+    return None
+
+
+def astar_path(source, target, stats):
+    """
+    A* search from source to target, both dense person numbers of
+    `graph`, using landmark lower bounds as the heuristic.
+
+    The bounds are consistent, so no queued person can lead to a path
+    shorter than the estimate of the one being expanded; the search stops
+    as soon as the target is reached at that length. Ties go to the
+    person furthest from the source. People expanded and the largest
+    queue size are counted in `stats`.
+    """
+    if landmarks is None:
+        raise ValueError("the astar engine needs a landmark index")
+    if landmarks.bounds(source, target) is None:
+        return None
+
+    # Maps person to (movie, person one step closer to the source)
+    parents = {source: None}
+    costs = {source: 0}
+    done = set()
+    queue = [(landmarks.lower_bound(source, target), 0, source)]
+    found = source == target
+    while queue and not found:
+        estimate, cost, person = heapq.heappop(queue)
+        cost = -cost
+        if person == target:
+            break
+        if person in done:
+            continue
+        done.add(person)
+        stats["expanded"] += 1
+        for movie, neighbor in graph.neighbors(person):
+            if neighbor in costs and costs[neighbor] <= cost + 1:
+                continue
+            costs[neighbor] = cost + 1
+            parents[neighbor] = (movie, person)
+            if neighbor == target and cost + 1 <= estimate:
+                found = True
+                break
+            heapq.heappush(queue, (cost + 1 + landmarks.lower_bound(neighbor, target),
+                                   -(cost + 1), neighbor))
+        stats["frontier_peak"] = max(stats["frontier_peak"], len(queue))
+    if target not in parents:
+        return None
+
+    output = []
+    while parents[target] is not None:
+        movie, previous = parents[target]
+        output.append((movie, target))
+        target = previous
+    output.reverse()
     return output
 
 
+def distance_estimate(source, target):
+    """
+    Bound the degrees of separation between two person_ids using the
+    landmark index alone, without searching.
+
+    Returns (lower, upper), with upper None when no landmark reaches
+    them, or None if they are known not to be connected.
+    """
+    if landmarks is None:
+        raise ValueError("distance_estimate needs a landmark index")
+    return landmarks.bounds(graph.person_index(source), graph.person_index(target))
+
+
+def join_paths(forward, backward, meeting):
+    """
+    Stitch the source half and target half of a bidirectional search
+    together at `meeting`.
+    """
+    output = []
+    person = meeting
+    while forward[person] is not None:
+        movie, previous = forward[person]
+        output.append((movie, person))
+        person = previous
+    output.reverse()
+
+    person = meeting
+    while backward[person] is not None:
+        movie, following = backward[person]
+        output.append((movie, following))
+        person = following
+    return output
+
+
+def distance_histogram(source):
+    """
+    Return a list whose d-th entry is the number of people exactly d
+    degrees of separation from person_id `source`, the source included
+    at distance 0. People not connected to the source are not counted.
+    """
+    start = graph.person_index(source)
+    seen_people = bytearray(graph.num_people())
+    seen_movies = bytearray(graph.num_movies())
+    seen_people[start] = 1
+    frontier = [start]
+    histogram = []
+    while frontier:
+        histogram.append(len(frontier))
+        next_frontier = []
+        for person in frontier:
+            for movie in graph.movies_of(person):
+                # Every star of a movie is reached the first time it is seen
+                if seen_movies[movie]:
+                    continue
+                seen_movies[movie] = 1
+                for star in graph.stars_of(movie):
+                    if not seen_people[star]:
+                        seen_people[star] = 1
+                        next_frontier.append(star)
+        frontier = next_frontier
+    return histogram
+
+
 def person_id_for_name(name):
     """
     Returns the IMDB id for a person's name,
@@ -145,17 +732,30 @@ def person_id_for_name(name):
         return person_ids[0]
 
 
+def search_people(query, limit=10):
+    """
+    Returns up to `limit` person_ids for a partially typed name, without
+    prompting. People whose names start with `query` come first, most
+    movies first. Only when no name starts with `query`, as after a typo,
+    are the closest fuzzy matches returned instead; a fuzzy search costs
+    far more than a prefix search, so it is not run on every keystroke.
+    """
+    rank = graph.degree
+    found = names.complete(query, limit, rank)
+    if not found:
+        found = names.fuzzy(query, limit, rank)
+    return [graph.person_ids[person] for person in found]
+
+
 def neighbors_for_person(person_id):
     """
     Returns (movie_id, person_id) pairs for people
     who starred with a given person.
     """
-    movie_ids = people[person_id]["movies"]
-    neighbors = set()
-    for movie_id in movie_ids:
-        for person_id in movies[movie_id]["stars"]:
-            neighbors.add((movie_id, person_id))
-    return neighbors
+    return {
+        (graph.movie_ids[movie], graph.person_ids[person])
+        for movie, person in graph.neighbors(graph.person_index(person_id))
+    }
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
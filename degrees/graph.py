@@ -0,0 +1,126 @@
+import bisect
+from array import array
+
+
+class Graph():
+    """
+    Person/movie star graph with people and movies numbered densely.
+
+    People and movies are numbered in sorted order of their IMDb ids, so
+    `person_ids[i]` is the id of person i and going the other way is a
+    bisect. Edges are stored in both directions, CSR style: the movies of
+    person i are person_movies[person_offsets[i]:person_offsets[i + 1]],
+    and the stars of movie m are found the same way through movie_offsets
+    and movie_stars.
+    """
+
+    def __init__(self, person_ids, movie_ids,
+                 person_offsets, person_movies, movie_offsets, movie_stars):
+        self.person_ids = person_ids
+        self.movie_ids = movie_ids
+        self.person_offsets = person_offsets
+        self.person_movies = person_movies
+        self.movie_offsets = movie_offsets
+        self.movie_stars = movie_stars
+
+    @classmethod
+    def from_edges(cls, person_ids, movie_ids, edges):
+        """
+        Build a graph from iterables of person and movie ids and
+        (person_id, movie_id) star pairs. Pairs naming an unknown person
+        or movie are skipped, and repeated pairs are kept only once.
+        """
+        person_ids = sorted(person_ids)
+        movie_ids = sorted(movie_ids)
+        person_index = {person_id: i for i, person_id in enumerate(person_ids)}
+        movie_index = {movie_id: i for i, movie_id in enumerate(movie_ids)}
+
+        edge_people = array("i")
+        edge_movies = array("i")
+        for person_id, movie_id in edges:
+            try:
+                person, movie = person_index[person_id], movie_index[movie_id]
+            except KeyError:
+                continue
+            edge_people.append(person)
+            edge_movies.append(movie)
+
+        person_offsets, person_movies = compress(len(person_ids), edge_people, edge_movies)
+        movie_offsets, movie_stars = compress(len(movie_ids), edge_movies, edge_people)
+        return cls(person_ids, movie_ids,
+                   person_offsets, person_movies, movie_offsets, movie_stars)
+
+    def num_people(self):
+        return len(self.person_ids)
+
+    def num_movies(self):
+        return len(self.movie_ids)
+
+    def person_index(self, person_id):
+        """
+        Return the dense number of `person_id`, raising KeyError if unknown.
+        """
+        return find(self.person_ids, person_id)
+
+    def movie_index(self, movie_id):
+        """
+        Return the dense number of `movie_id`, raising KeyError if unknown.
+        """
+        return find(self.movie_ids, movie_id)
+
+    def movies_of(self, person):
+        return self.person_movies[self.person_offsets[person]:self.person_offsets[person + 1]]
+
+    def stars_of(self, movie):
+        return self.movie_stars[self.movie_offsets[movie]:self.movie_offsets[movie + 1]]
+
+    def degree(self, person):
+        """
+        Return the number of movies `person` starred in.
+        """
+        return self.person_offsets[person + 1] - self.person_offsets[person]
+
+    def neighbors(self, person):
+        """
+        Yield (movie, person) pairs of dense numbers for everyone who
+        starred with `person`, including `person` itself.
+        """
+        movie_offsets, movie_stars = self.movie_offsets, self.movie_stars
+        for movie in self.movies_of(person):
+            for star in movie_stars[movie_offsets[movie]:movie_offsets[movie + 1]]:
+                yield movie, star
+
+
+def find(table, key):
+    """
+    Return the position of `key` in the sorted sequence `table`.
+    """
+    i = bisect.bisect_left(table, key)
+    if i == len(table) or table[i] != key:
+        raise KeyError(key)
+    return i
+
+
+def compress(rows, sources, targets):
+    """
+    Group parallel edge arrays by source into CSR offsets/targets arrays,
+    dropping repeated targets within a row.
+    """
+    counts = array("q", bytes(8 * (rows + 1)))
+    for source in sources:
+        counts[source + 1] += 1
+    for row in range(rows):
+        counts[row + 1] += counts[row]
+
+    filled = array("q", counts)
+    grouped = array("i", bytes(4 * len(targets)))
+    for source, target in zip(sources, targets):
+        grouped[filled[source]] = target
+        filled[source] += 1
+
+    offsets = array("q", [0])
+    values = array("i")
+    for row in range(rows):
+        values.extend(sorted(set(grouped[counts[row]:counts[row + 1]])))
+        offsets.append(len(values))
+    return offsets, values
@@ -0,0 +1,105 @@
+import heapq
+from array import array
+
+import snapshot
+
+# Distance stored for people a landmark cannot reach
+UNREACHABLE = -1
+
+
+class LandmarkIndex():
+    """
+    Distances from a few landmark people to everyone in a Graph.
+
+    By the triangle inequality, for any landmark L the distance between s
+    and t is at least |d(L, s) - d(L, t)| and at most d(L, s) + d(L, t),
+    so a handful of landmarks bounds any distance without searching.
+    Works on dense person numbers of the graph.
+    """
+
+    def __init__(self, landmarks, distances):
+        self.landmarks = landmarks
+        self.distances = distances
+
+    @classmethod
+    def build(cls, graph, k):
+        """
+        Pick the `k` people with the most movies and search from each.
+        """
+        landmarks = array("i", heapq.nlargest(k, range(graph.num_people()), key=graph.degree))
+        return cls(landmarks, [distances_from(graph, landmark) for landmark in landmarks])
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Memory-map an index written by `save`, returning it with the
+        metadata saved alongside.
+        """
+        sections, metadata = snapshot.load(filename)
+        landmarks = sections["landmarks"]
+        distances = [sections[f"distances_{i}"] for i in range(len(landmarks))]
+        return cls(landmarks, distances), metadata
+
+    def save(self, filename, metadata):
+        sections = {"landmarks": array("i", self.landmarks)}
+        for i, distances in enumerate(self.distances):
+            sections[f"distances_{i}"] = array("h", distances)
+        snapshot.save(filename, sections, metadata)
+
+    def bounds(self, source, target):
+        """
+        Return (lower, upper) bounds on the distance from source to
+        target, with upper None if no landmark reaches both. Return None
+        if some landmark reaches only one of them, since then they are
+        not connected.
+        """
+        lower = 0 if source == target else 1
+        upper = None
+        for distances in self.distances:
+            to_source, to_target = distances[source], distances[target]
+            if to_source == UNREACHABLE and to_target == UNREACHABLE:
+                continue
+            if to_source == UNREACHABLE or to_target == UNREACHABLE:
+                return None
+            lower = max(lower, abs(to_source - to_target))
+            if upper is None or to_source + to_target < upper:
+                upper = to_source + to_target
+        return lower, upper
+
+    def lower_bound(self, source, target):
+        """
+        Return a lower bound on the distance from source to target, for
+        use as an A* heuristic.
+        """
+        lower = 0
+        for distances in self.distances:
+            to_source, to_target = distances[source], distances[target]
+            if to_source != UNREACHABLE and to_target != UNREACHABLE:
+                lower = max(lower, abs(to_source - to_target))
+        return lower
+
+
+def distances_from(graph, source):
+    """
+    Return an array of the distance from `source` to every person,
+    UNREACHABLE for people in another component.
+    """
+    distances = array("h", [UNREACHABLE]) * graph.num_people()
+    seen_movies = bytearray(graph.num_movies())
+    distances[source] = 0
+    frontier = [source]
+    depth = 0
+    while frontier:
+        depth += 1
+        next_frontier = []
+        for person in frontier:
+            for movie in graph.movies_of(person):
+                if seen_movies[movie]:
+                    continue
+                seen_movies[movie] = 1
+                for star in graph.stars_of(movie):
+                    if distances[star] == UNREACHABLE:
+                        distances[star] = depth
+                        next_frontier.append(star)
+        frontier = next_frontier
+    return distances
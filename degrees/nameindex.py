@@ -0,0 +1,138 @@
+import bisect
+import heapq
+from array import array
+from collections.abc import Mapping
+
+
+class NameIndex(Mapping):
+    """
+    Mapping from lowercase names to sets of person_ids.
+
+    Backed by a sorted table of lowercase names, one entry per person, and
+    an aligned array of the person number each entry belongs to. Exact
+    lookups and prefix searches are bisects into the table; fuzzy searches
+    go through a trigram index of the table, built along with it.
+    """
+
+    def __init__(self, keys, people, person_ids, trigrams):
+        self.keys_table = keys
+        self.people = people
+        self.person_ids = person_ids
+        # (sorted trigrams, CSR offsets, entry numbers), see build_trigrams
+        self.trigrams = trigrams
+
+    @classmethod
+    def build(cls, person_names, person_ids):
+        """
+        Index `person_names`, a sequence aligned with the person numbers.
+        """
+        entries = sorted((name.lower(), person) for person, name in enumerate(person_names))
+        keys = [key for key, _ in entries]
+        return cls(keys, array("i", [person for _, person in entries]), person_ids,
+                   build_trigrams(keys))
+
+    def __getitem__(self, key):
+        start, end = self.span(key)
+        if start == end:
+            raise KeyError(key)
+        return {self.person_ids[person] for person in self.people[start:end]}
+
+    def __iter__(self):
+        previous = None
+        for key in self.keys_table:
+            if key != previous:
+                yield key
+            previous = key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def span(self, key):
+        """
+        Return the range of entries whose name is exactly `key`.
+        """
+        start = bisect.bisect_left(self.keys_table, key)
+        return start, bisect.bisect_right(self.keys_table, key, lo=start)
+
+    def complete(self, prefix, limit, rank):
+        """
+        Return up to `limit` person numbers whose lowercase name starts
+        with `prefix`, highest `rank(person)` first.
+        """
+        prefix = prefix.lower()
+        start = bisect.bisect_left(self.keys_table, prefix)
+        end = bisect.bisect_left(self.keys_table, prefix + "\U0010ffff", lo=start)
+        return heapq.nlargest(limit, self.people[start:end], key=rank)
+
+    def fuzzy(self, query, limit, rank):
+        """
+        Return up to `limit` person numbers whose names are most similar
+        to `query` by trigram Jaccard similarity, ties broken by highest
+        `rank(person)`.
+
+        Only names sharing at least half of the query's trigrams are
+        considered. Any such name must contain one of the rarest
+        len(wanted) - needed + 1 trigrams, so candidates are drawn from
+        those posting lists alone and the common ones are never scanned.
+        """
+        grams, offsets, entries = self.trigrams
+
+        wanted = trigrams_of(query.lower())
+        postings = []
+        for gram in wanted:
+            i = bisect.bisect_left(grams, gram)
+            if i < len(grams) and grams[i] == gram:
+                postings.append(entries[offsets[i]:offsets[i + 1]])
+            else:
+                postings.append(())
+        postings.sort(key=len)
+        needed = (len(wanted) + 1) // 2
+
+        candidates = set()
+        for posting in postings[:len(wanted) - needed + 1]:
+            candidates.update(posting)
+
+        scored = []
+        for entry in candidates:
+            grams_of_entry = trigrams_of(self.keys_table[entry])
+            shared = len(wanted & grams_of_entry)
+            if shared >= needed:
+                similarity = shared / len(wanted | grams_of_entry)
+                scored.append((similarity, entry))
+
+        best = heapq.nlargest(limit, scored,
+                              key=lambda item: (item[0], rank(self.people[item[1]])))
+        return [self.people[entry] for _, entry in best]
+
+
+def trigrams_of(name):
+    """
+    Return the set of three letter substrings of `name`, padded so that
+    the start and end of the name count as well.
+    """
+    padded = f"  {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def build_trigrams(keys):
+    """
+    Return (sorted trigrams, offsets, entries) such that the positions in
+    `keys` of every name containing trigrams[i] are
+    entries[offsets[i]:offsets[i + 1]].
+    """
+    postings = {}
+    for entry, key in enumerate(keys):
+        for gram in trigrams_of(key):
+            posting = postings.get(gram)
+            if posting is None:
+                postings[gram] = [entry]
+            else:
+                posting.append(entry)
+
+    grams = sorted(postings)
+    offsets = array("q", [0])
+    entries = array("i")
+    for gram in grams:
+        entries.extend(postings[gram])
+        offsets.append(len(entries))
+    return grams, offsets, entries
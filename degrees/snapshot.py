@@ -0,0 +1,149 @@
+import json
+import mmap
+import sys
+from array import array
+from collections.abc import Mapping
+
+from graph import find
+
+# First bytes of every snapshot file
+MAGIC = b"DEGRIDX1"
+
+# Sections are padded so every array starts on an 8 byte boundary
+ALIGN = 8
+
+
+def save(filename, sections, metadata):
+    """
+    Write `sections` to a binary snapshot file.
+
+    `sections` maps names to either an `array` or a list of strings.
+    String lists are stored as a utf-8 blob plus an array of offsets so
+    they can be read back without decoding the whole table.
+    `metadata` is any JSON-serializable dictionary stored alongside.
+    """
+    chunks = []
+    layout = {}
+    position = 0
+
+    def place(data):
+        nonlocal position
+        position += -position % ALIGN
+        chunks.append((position, data))
+        start = position
+        position += len(data)
+        return start
+
+    for name, values in sections.items():
+        if isinstance(values, array):
+            layout[name] = {
+                "kind": "array",
+                "typecode": values.typecode,
+                "offset": place(values.tobytes()),
+                "count": len(values)
+            }
+        else:
+            encoded = [value.encode("utf-8") for value in values]
+            offsets = array("q", [0])
+            for value in encoded:
+                offsets.append(offsets[-1] + len(value))
+            layout[name] = {
+                "kind": "strings",
+                "offset": place(offsets.tobytes()),
+                "count": len(encoded),
+                "blob": place(b"".join(encoded)),
+                "size": offsets[-1]
+            }
+
+    header = json.dumps({
+        "byteorder": sys.byteorder,
+        "metadata": metadata,
+        "sections": layout
+    }).encode("utf-8")
+    body_start = len(MAGIC) + 8 + len(header)
+    body_start += -body_start % ALIGN
+
+    with open(filename, "wb") as f:
+        f.write(MAGIC)
+        f.write(len(header).to_bytes(8, "little"))
+        f.write(header)
+        for offset, data in chunks:
+            f.seek(body_start + offset)
+            f.write(data)
+
+
+def load(filename):
+    """
+    Memory-map a snapshot written by `save`.
+
+    Return (sections, metadata), where arrays come back as read-only
+    memoryviews and string lists as StringTables over the mapped file.
+    Raise ValueError if the file is not a snapshot for this machine.
+    """
+    with open(filename, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mapped)
+
+    if bytes(view[:len(MAGIC)]) != MAGIC:
+        raise ValueError(f"{filename} is not a degrees snapshot")
+    header_end = len(MAGIC) + 8
+    header_size = int.from_bytes(view[len(MAGIC):header_end], "little")
+    header = json.loads(bytes(view[header_end:header_end + header_size]))
+    if header["byteorder"] != sys.byteorder:
+        raise ValueError(f"{filename} was written on a {header['byteorder']}-endian machine")
+    body_start = header_end + header_size
+    body_start += -body_start % ALIGN
+
+    def section(offset, typecode, count):
+        start = body_start + offset
+        size = count * array(typecode).itemsize
+        return view[start:start + size].cast(typecode)
+
+    sections = {}
+    for name, entry in header["sections"].items():
+        if entry["kind"] == "array":
+            sections[name] = section(entry["offset"], entry["typecode"], entry["count"])
+        else:
+            offsets = section(entry["offset"], "q", entry["count"] + 1)
+            start = body_start + entry["blob"]
+            sections[name] = StringTable(offsets, view[start:start + entry["size"]])
+    return sections, header["metadata"]
+
+
+class StringTable():
+    """
+    Read-only sequence of strings decoded on access from a utf-8 blob.
+    """
+
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return str(self.blob[self.offsets[i]:self.offsets[i + 1]], "utf-8")
+
+
+class Records(Mapping):
+    """
+    Mapping from ids to dictionaries of display fields, read from tables
+    aligned with the sorted `ids` table.
+    """
+
+    def __init__(self, ids, **fields):
+        self.ids = ids
+        self.fields = fields
+
+    def __getitem__(self, key):
+        i = find(self.ids, key)
+        return {field: table[i] for field, table in self.fields.items()}
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __len__(self):
+        return len(self.ids)
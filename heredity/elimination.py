@@ -0,0 +1,217 @@
+import heapq
+
+import numpy as np
+
+from inheritance import inheritance_table
+
+# Gene counts, which are also the index of each count along a factor axis
+GENES = (0, 1, 2)
+
+# Most people a clique may hold; its potential has 3 ** MAX_CLIQUE entries,
+# 3 ** 14 float64s being about 40 MB
+MAX_CLIQUE = 14
+
+
+class JunctionTree():
+    """
+    Exact inference over a pedigree by message passing on a junction tree.
+
+    Every person has a gene variable, and each person's factor ties their
+    gene count to their parents'. Eliminating the variables one at a time
+    in `order` leaves, for each person, a clique of that person and the
+    not yet eliminated people sharing a factor with them. Those cliques
+    form a tree, and one pass up and one pass down it give every person's
+    marginal, in time linear in family size for cliques of bounded size.
+
+    The tree depends only on who the parents are, so one tree can be
+    reused for any traits observed on the same family, see `structure`.
+    Raises ValueError when a clique would hold more than MAX_CLIQUE people.
+    """
+
+    def __init__(self, parents):
+        self.parents = parents
+        self.order = elimination_order(moral_graph(parents))
+        self.position = position = {person: i for i, person in enumerate(self.order)}
+
+        # Clique of each person is them plus their neighbors when they are
+        # eliminated, and hangs below the clique of the first of those
+        # neighbors to be eliminated later
+        neighbors = moral_graph(parents)
+        self.cliques = []
+        self.up = []
+        for person in self.order:
+            rest = sorted(neighbors.pop(person), key=position.get)
+            for neighbor in rest:
+                neighbors[neighbor].discard(person)
+                neighbors[neighbor].update(other for other in rest if other != neighbor)
+            if len(rest) + 1 > MAX_CLIQUE:
+                raise ValueError(f"family needs a clique of {len(rest) + 1} people, more than "
+                                 f"the {MAX_CLIQUE} exact inference allows; "
+                                 f"use the gibbs engine instead")
+            self.cliques.append((person, *rest))
+            self.up.append(position[rest[0]] if rest else None)
+
+        # Each person's factor goes to the clique of whichever of its
+        # people is eliminated first, which holds all of them
+        self.home = [[] for _ in self.order]
+        for person, (mother, father) in parents.items():
+            family = [person] + ([mother, father] if mother is not None else [])
+            self.home[min(position[member] for member in family)].append(person)
+
+    @staticmethod
+    def structure(people):
+        """
+        Return the person -> (mother, father) mapping a tree is built from.
+        """
+        return {
+            person: (people[person]["mother"], people[person]["father"])
+            for person in people
+        }
+
+    def probabilities(self, people, probs):
+        """
+        Return the gene and trait distribution of each person, given the
+        traits observed in `people`, as a `heredity.main` style dictionary.
+        """
+        potentials = []
+        for clique, persons in zip(self.cliques, self.home):
+            potential = (clique, np.ones((3,) * len(clique)))
+            for person in persons:
+                potential = multiply(potential, person_factor(people, person, probs))
+            potentials.append(potential)
+
+        # Upwards, each clique sends what it knows about the people it
+        # shares with the clique above, scaled to sum to 1 against underflow
+        messages = [None] * len(self.cliques)
+        for i, up in enumerate(self.up):
+            if up is not None:
+                messages[i] = scaled(marginal(potentials[i], self.cliques[i][1:]))
+                potentials[up] = multiply(potentials[up], messages[i])
+
+        # Downwards, each clique divides back out what it sent up, then
+        # takes in everything else the clique above knows
+        for i in reversed(range(len(self.cliques))):
+            up = self.up[i]
+            if up is not None:
+                above = marginal(potentials[up], self.cliques[i][1:])
+                message = (above[0], np.divide(above[1], messages[i][1], out=np.zeros_like(above[1]),
+                                               where=messages[i][1] > 0))
+                potentials[i] = multiply(potentials[i], scaled(message))
+
+        probabilities = {}
+        for person in people:
+            _, genes = scaled(marginal(potentials[self.position[person]], (person,)))
+            trait = people[person]["trait"]
+            if trait is None:
+                has_trait = sum(genes[gene] * probs["trait"][gene][True] for gene in GENES)
+            else:
+                has_trait = float(trait)
+            probabilities[person] = {
+                "gene": {gene: float(genes[gene]) for gene in reversed(GENES)},
+                "trait": {True: float(has_trait), False: float(1 - has_trait)}
+            }
+        return probabilities
+
+
+def moral_graph(parents):
+    """
+    Return person -> set of people sharing a factor with them: their
+    parents, their children, and the other parent of their children.
+    """
+    neighbors = {person: set() for person in parents}
+    for person, (mother, father) in parents.items():
+        if mother is not None:
+            family = (person, mother, father)
+            for member in family:
+                neighbors[member].update(other for other in family if other != member)
+    return neighbors
+
+
+def elimination_order(neighbors):
+    """
+    Return an order to eliminate people in, picking each time the person
+    whose elimination adds the fewest new links between their neighbors.
+
+    Only people within two links of the one eliminated can change score,
+    so only they are scored again, and a heap of scores holds out of date
+    entries until they come up.
+    """
+    neighbors = {person: set(links) for person, links in neighbors.items()}
+    rank = {person: i for i, person in enumerate(neighbors)}
+
+    def score(person):
+        links = neighbors[person]
+        fill = sum(1 for a in links for b in links if rank[a] < rank[b] and b not in neighbors[a])
+        return fill, len(links), rank[person]
+
+    scores = {person: score(person) for person in neighbors}
+    heap = [(value, person) for person, value in scores.items()]
+    heapq.heapify(heap)
+    order = []
+    while heap:
+        value, person = heapq.heappop(heap)
+        if scores.get(person) != value:
+            continue
+        del scores[person]
+        order.append(person)
+        links = neighbors.pop(person)
+        for neighbor in links:
+            neighbors[neighbor].discard(person)
+            neighbors[neighbor].update(other for other in links if other != neighbor)
+        affected = set(links)
+        for neighbor in links:
+            affected.update(neighbors[neighbor])
+        for other in affected:
+            scores[other] = score(other)
+            heapq.heappush(heap, (scores[other], other))
+    return order
+
+
+def person_factor(people, person, probs):
+    """
+    Return the factor of one person: the probability of their gene count
+    given their parents' (or unconditionally, without parents), times the
+    probability of their trait if it was observed.
+    """
+    trait = people[person]["trait"]
+    evidence = np.array([1 if trait is None else probs["trait"][gene][trait] for gene in GENES])
+    mother, father = people[person]["mother"], people[person]["father"]
+    if mother is None:
+        return (person,), np.array([probs["gene"][gene] for gene in GENES]) * evidence
+
+    table = inheritance_table(probs)
+    return (person, mother, father), table * evidence[:, None, None]
+
+
+def multiply(first, second):
+    """
+    Return the product of two factors, over the people of both.
+    """
+    people = first[0] + tuple(person for person in second[0] if person not in first[0])
+    return people, aligned(first, people) * aligned(second, people)
+
+
+def aligned(factor, people):
+    """
+    Return a factor's table with its axes in the order of `people` and
+    length one axes for the people it does not involve.
+    """
+    own, table = factor
+    present = [person for person in people if person in own]
+    table = np.transpose(table, [own.index(person) for person in present])
+    return table.reshape([3 if person in own else 1 for person in people])
+
+
+def marginal(factor, people):
+    """
+    Return a factor summed over everyone but `people`, in that order.
+    """
+    own, table = factor
+    table = table.sum(axis=tuple(i for i, person in enumerate(own) if person not in people))
+    kept = tuple(person for person in own if person in people)
+    return tuple(people), np.transpose(table, [kept.index(person) for person in people])
+
+
+def scaled(factor):
+    people, table = factor
+    return people, table / table.sum()
@@ -1,6 +1,17 @@
+import argparse
 import csv
 import itertools
+import json
+import multiprocessing
+import os
 import sys
+from collections import OrderedDict
+
+import numpy as np
+
+from elimination import JunctionTree
+from inheritance import inheritance_table, parents_first
+from sampling import sample_probabilities
 
 PROBS = {
 
@@ -36,13 +47,205 @@ PROBS = {
     "mutation": 0.01
 }
 
+# Inference methods understood by infer
+ENGINES = ("eliminate", "enumerate", "vector", "gibbs")
+
+# Assignments scored at once by the "vector" engine
+BLOCK = 1 << 16
+
+# Largest standard error the "gibbs" engine stops at
+PRECISION = 0.005
+
+# Number of junction trees, one per family shape, kept by batch mode
+CACHE_SIZE = 256
+
+# Families handed to a worker process at a time
+CHUNK_SIZE = 16
+
+# Junction trees of the current batch, one cache per process
+trees = None
+
 
 def main():
+    parser = argparse.ArgumentParser(
+        usage="python heredity.py data.csv [--engine ENGINE] [--batch]"
+    )
+    parser.add_argument("data")
+    parser.add_argument("--engine", choices=ENGINES, default="eliminate",
+                        help="exact inference by junction tree or by trying every assignment, "
+                        "or approximate by Gibbs sampling")
+    parser.add_argument("--precision", type=float, default=PRECISION,
+                        help="standard error the gibbs engine samples down to")
+    parser.add_argument("--workers", type=int,
+                        help="processes the gibbs engine runs its chains on, "
+                        "or batch families are spread over")
+    parser.add_argument("--batch", action="store_true",
+                        help="read every family of a directory of CSV files or of a CSV file "
+                        "with a family column, writing one JSON line per family")
+    parser.add_argument("--cache-size", type=int, default=CACHE_SIZE,
+                        help="junction trees kept between batch families")
+    args = parser.parse_args()
+
+    if args.batch:
+        run_batch(load_families(args.data), sys.stdout, args.engine,
+                  args.workers or os.cpu_count(), args.cache_size, args.precision)
+        return
+
+    people = load_data(args.data)
+    if args.engine == "gibbs":
+        probabilities, errors = sample_probabilities(people, PROBS, args.precision, args.workers)
+    else:
+        probabilities, errors = infer(people, args.engine), None
+
+    # Print results
+    for person in people:
+        print(f"{person}:")
+        for field in probabilities[person]:
+            print(f"  {field.capitalize()}:")
+            for value in probabilities[person][field]:
+                p = probabilities[person][field][value]
+                if errors is None:
+                    print(f"    {value}: {p:.4f}")
+                else:
+                    print(f"    {value}: {p:.4f} (± {errors[person][field][value]:.4f})")
+
+
+def run_batch(families, out, engine="eliminate", workers=1, cache_size=CACHE_SIZE,
+              precision=PRECISION):
+    """
+    Infer every family of `families`, (name, CSV rows) pairs as
+    `load_families` yields them, writing a JSON line to `out` as each is
+    done.
+
+    Lines hold the family name and either its probabilities, in the shape
+    `infer` returns (with standard errors as well for "gibbs"), or why the
+    family could not be read or inferred on; one bad family does not stop
+    the batch. Junction trees are shared between families
+    of the same shape, see TreeCache. With more than one worker, families
+    are spread over a process pool; lines are still written in input order.
+    """
+    global trees
+
+    trees = TreeCache(cache_size)
+    jobs = ((name, rows, engine, precision) for name, rows in families)
+    if workers > 1:
+        with multiprocessing.Pool(workers, initializer=init_worker,
+                                  initargs=(cache_size,)) as pool:
+            for line in pool.imap(batch_family, jobs, CHUNK_SIZE):
+                out.write(line)
+                out.flush()
+    else:
+        for job in jobs:
+            out.write(batch_family(job))
+            out.flush()
+
+
+def init_worker(cache_size):
+    global trees
+
+    trees = TreeCache(cache_size)
+
+
+def batch_family(job):
+    """
+    Return the batch result line for one family.
+    """
+    name, rows, engine, precision = job
+    result = {"family": name}
+    try:
+        people = {row["name"]: person_row(row) for row in rows}
+        problem = family_problem(people)
+        if problem is not None:
+            result["error"] = problem
+        elif engine == "eliminate":
+            result["probabilities"] = trees.probabilities(people)
+        elif engine == "gibbs":
+            # Families already run in parallel, so each samples in one process
+            result["probabilities"], result["errors"] = sample_probabilities(
+                people, PROBS, precision, workers=1)
+        else:
+            result["probabilities"] = infer(people, engine)
+    except KeyError as error:
+        result = {"family": name, "error": f"missing {error}"}
+    except (ValueError, MemoryError) as error:
+        result = {"family": name, "error": str(error) or type(error).__name__}
+    return json.dumps(result) + "\n"
+
+
+def family_problem(people):
+    """
+    Return why `people` is not a family that can be inferred on, or None.
+    """
+    for person in people.values():
+        mother, father = person["mother"], person["father"]
+        if (mother is None) != (father is None):
+            return f"{person['name']} has only one parent"
+        for parent in (mother, father):
+            if parent is not None and parent not in people:
+                return f"{person['name']} has parent {parent}, who is not in the family"
+    return None
+
+
+class TreeCache():
+    """
+    Least recently used cache of JunctionTrees keyed by the shape of a
+    family: the positions of each person's parents in it. Families listed
+    in the same order with the same parents share a tree, whatever their
+    names and traits.
+    """
+
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self.trees = OrderedDict()
+
+    def probabilities(self, people):
+        names = list(people)
+        position = {name: i for i, name in enumerate(names)}
+        numbered = {
+            i: {
+                "name": i,
+                "mother": position.get(people[name]["mother"]),
+                "father": position.get(people[name]["father"]),
+                "trait": people[name]["trait"]
+            }
+            for i, name in enumerate(names)
+        }
+        parents = JunctionTree.structure(numbered)
+        shape = tuple(parents.values())
+        tree = self.trees.get(shape)
+        if tree is None:
+            tree = JunctionTree(parents)
+            self.trees[shape] = tree
+            if len(self.trees) > self.size:
+                self.trees.popitem(last=False)
+        else:
+            self.trees.move_to_end(shape)
+        probabilities = tree.probabilities(numbered, PROBS)
+        return {names[i]: probabilities[i] for i in numbered}
 
-    # Check for proper usage
-    if len(sys.argv) != 2:
-        sys.exit("Usage: python heredity.py data.csv")
-    people = load_data(sys.argv[1])
+
+def infer(people, engine="eliminate"):
+    """
+    Return each person's gene and trait distribution given the observed
+    traits in `people`, as a dictionary of person -> {"gene": {2: p,
+    1: p, 0: p}, "trait": {True: p, False: p}}.
+
+    `engine` picks how: "eliminate" passes messages on a junction tree of
+    the family (see elimination.JunctionTree), "enumerate" sums over every
+    assignment of genes (see gene_assignments), "vector" sums over every
+    assignment of genes and unknown traits in NumPy blocks (see
+    vector_probabilities), and "gibbs" estimates them to within PRECISION
+    standard error by sampling (see sampling.sample_probabilities).
+    """
+    if engine == "eliminate":
+        tree = JunctionTree(JunctionTree.structure(people))
+        return tree.probabilities(people, PROBS)
+    if engine == "vector":
+        return vector_probabilities(people)
+    if engine == "gibbs":
+        return sample_probabilities(people, PROBS, PRECISION)[0]
+    if engine != "enumerate":
+        raise ValueError(f"unknown engine: {engine}")
 
     # Keep track of gene and trait probabilities for each person
     probabilities = {
@@ -60,38 +263,139 @@ def main():
         for person in people
     }
 
-    # Loop over all sets of people who might have the trait
-    names = set(people)
-    for have_trait in powerset(names):
+    # Traits of people whose trait is unknown are summed out directly, so
+    # only gene assignments are enumerated
+    for genes, p in gene_assignments(people):
+        for person, gene in genes.items():
+            probabilities[person]["gene"][gene] += p
+            trait = people[person]["trait"]
+            if trait is None:
+                probabilities[person]["trait"][True] += p * PROBS["trait"][gene][True]
+                probabilities[person]["trait"][False] += p * PROBS["trait"][gene][False]
+            else:
+                probabilities[person]["trait"][trait] += p
 
-        # Check if current set of people violates known information
-        fails_evidence = any(
-            (people[person]["trait"] is not None and
-             people[person]["trait"] != (person in have_trait))
-            for person in names
-        )
-        if fails_evidence:
-            continue
+    # Ensure probabilities sum to 1
+    normalize(probabilities)
+    return probabilities
+
+
+def gene_assignments(people):
+    """
+    Yield every assignment of gene counts to `people` as a (person ->
+    count dictionary, probability) pair, where probability is that of the
+    assignment and of the traits observed in `people`.
+
+    People are assigned parents first, so each person's term is known as
+    soon as they are, and the product is built up one person at a time.
+    Traits only enter for people whose trait was observed; summing over
+    the traits of the others would multiply by 1.
+    """
+    order = parents_first(JunctionTree.structure(people))
+    inherit_table = inheritance_table(PROBS).tolist()
+    genes = {}
+
+    def assign(i, p):
+        if i == len(order):
+            yield dict(genes), p
+            return
+        person = order[i]
+        mother = people[person]["mother"]
+        father = people[person]["father"]
+        trait = people[person]["trait"]
+        for gene in (0, 1, 2):
+            if mother and father:
+                term = inherit_table[gene][genes[mother]][genes[father]]
+            else:
+                term = PROBS["gene"][gene]
+            if trait is not None:
+                term *= PROBS["trait"][gene][trait]
+            genes[person] = gene
+            yield from assign(i + 1, p * term)
 
-        # Loop over all sets of people who might have the gene
-        for one_gene in powerset(names):
-            for two_genes in powerset(names - one_gene):
+    yield from assign(0, 1)
 
-                # Update probabilities with new joint probability
-                p = joint_probability(people, one_gene, two_genes, have_trait)
-                update(probabilities, one_gene, two_genes, have_trait, p)
 
-    # Ensure probabilities sum to 1
+def vector_probabilities(people, block=BLOCK):
+    """
+    Return each person's gene and trait distribution, as `infer` does, by
+    working out the joint probability of every assignment of genes and of
+    the traits nobody observed, about `block` at a time.
+
+    Gene assignment k is read off the base 3 digits of k, one per person.
+    Each block takes a run of gene assignments together with every
+    assignment of the unknown traits, see joint_probabilities.
+    """
+    names = list(people)
+    unknown = [i for i, person in enumerate(names) if people[person]["trait"] is None]
+    known = [i for i, person in enumerate(names) if people[person]["trait"] is not None]
+    observed = [int(people[names[i]]["trait"]) for i in known]
+    powers = 3 ** np.arange(len(names), dtype=np.int64)
+    columns = np.arange(len(names))
+    rows = max(1, block >> len(unknown))
+
+    gene_sums = np.zeros((len(names), 3))
+    trait_sums = np.zeros((len(names), 2))
+    for start in range(0, 3 ** len(names), rows):
+        number = np.arange(start, min(start + rows, 3 ** len(names)), dtype=np.int64)
+        genes = number[:, None] // powers % 3
+        p = joint_probabilities(people, names, genes)
+
+        # Axis 0 of p is the gene assignment, axis i + 1 the trait of
+        # the i-th person in `unknown`
+        totals = p.reshape(len(genes), -1).sum(axis=1)
+        np.add.at(gene_sums, (columns, genes), totals[:, None])
+        trait_sums[known, observed] += totals.sum()
+        for axis, i in enumerate(unknown, 1):
+            trait_sums[i] += p.sum(axis=tuple(other for other in range(p.ndim) if other != axis))
+
+    probabilities = {
+        person: {
+            "gene": {gene: float(gene_sums[i, gene]) for gene in (2, 1, 0)},
+            "trait": {True: float(trait_sums[i, 1]), False: float(trait_sums[i, 0])}
+        }
+        for i, person in enumerate(names)
+    }
     normalize(probabilities)
+    return probabilities
 
-    # Print results
-    for person in people:
-        print(f"{person}:")
-        for field in probabilities[person]:
-            print(f"  {field.capitalize()}:")
-            for value in probabilities[person][field]:
-                p = probabilities[person][field][value]
-                print(f"    {value}: {p:.4f}")
+
+def joint_probabilities(people, names, genes):
+    """
+    Compute and return the joint probability of a whole block of
+    assignments, as joint_probability does for one.
+
+    `genes` holds gene counts with one row per gene assignment and one
+    column per person in `names`. Each row is combined with every
+    assignment of the traits not given in `people`: the result has one
+    axis for the rows, then one length 2 axis (False, True) per person
+    whose trait is unknown, in `names` order. Each person's terms are
+    looked up from tables of PROBS for all rows at once.
+    """
+    index = {person: i for i, person in enumerate(names)}
+    children = [i for i, person in enumerate(names) if people[person]["mother"]]
+    founders = [i for i, person in enumerate(names) if not people[person]["mother"]]
+    mothers = [index[people[names[i]]["mother"]] for i in children]
+    fathers = [index[people[names[i]]["father"]] for i in children]
+    known = [i for i, person in enumerate(names) if people[person]["trait"] is not None]
+    unknown = [i for i, person in enumerate(names) if people[person]["trait"] is None]
+    observed = [int(people[names[i]]["trait"]) for i in known]
+
+    gene_table = np.array([PROBS["gene"][gene] for gene in (0, 1, 2)])
+    trait_table = np.array([[PROBS["trait"][gene][False], PROBS["trait"][gene][True]]
+                            for gene in (0, 1, 2)])
+    inherit_table = inheritance_table(PROBS)
+
+    terms = np.empty(genes.shape)
+    terms[:, founders] = gene_table[genes[:, founders]]
+    terms[:, children] = inherit_table[genes[:, children], genes[:, mothers], genes[:, fathers]]
+    terms[:, known] *= trait_table[genes[:, known], observed]
+    p = terms.prod(axis=1)
+
+    # Each unknown trait doubles the assignments, one new axis at a time
+    for i in unknown:
+        p = p[..., None] * trait_table[genes[:, i]].reshape((len(genes),) + (1,) * (p.ndim - 1) + (2,))
+    return p
 
 
 def load_data(filename):
@@ -105,17 +409,48 @@ def load_data(filename):
     with open(filename) as f:
         reader = csv.DictReader(f)
         for row in reader:
-            name = row["name"]
-            data[name] = {
-                "name": name,
-                "mother": row["mother"] or None,
-                "father": row["father"] or None,
-                "trait": (True if row["trait"] == "1" else
-                          False if row["trait"] == "0" else None)
-            }
+            data[row["name"]] = person_row(row)
     return data
 
 
+def load_families(path):
+    """
+    Yield (family name, CSV rows) for every family in `path`, a CSV file
+    or a directory of them. Rows are parsed by `batch_family`, so a bad
+    row only fails its own family.
+
+    A file with a "family" column holds one family per value of it, and
+    one without is a single family named after the file.
+    """
+    if os.path.isdir(path):
+        filenames = [os.path.join(path, name) for name in sorted(os.listdir(path))
+                     if name.endswith(".csv")]
+    else:
+        filenames = [path]
+
+    for filename in filenames:
+        default = os.path.splitext(os.path.basename(filename))[0]
+        families = dict()
+        with open(filename) as f:
+            reader = csv.DictReader(f)
+            for row in reader:
+                families.setdefault(row.get("family") or default, []).append(row)
+        yield from families.items()
+
+
+def person_row(row):
+    """
+    Return a person's `load_data` entry from their CSV row.
+    """
+    return {
+        "name": row["name"],
+        "mother": row["mother"] or None,
+        "father": row["father"] or None,
+        "trait": (True if row["trait"] == "1" else
+                  False if row["trait"] == "0" else None)
+    }
+
+
 def powerset(s):
     """
     Return a list of all possible subsets of set s.
@@ -0,0 +1,42 @@
+import numpy as np
+
+
+def inheritance_table(probs):
+    """
+    Return the probability of a child's gene count given their parents',
+    as an array indexed [child's gene, mother's gene, father's gene].
+    """
+    # Probability each parent passes the gene on, by their gene count
+    passes = np.array([probs["mutation"], 0.5, 1 - probs["mutation"]])
+    from_mother = passes[None, :, None]
+    from_father = passes[None, None, :]
+    return np.concatenate([
+        (1 - from_mother) * (1 - from_father),
+        from_mother * (1 - from_father) + (1 - from_mother) * from_father,
+        from_mother * from_father
+    ])
+
+
+def parents_first(parents):
+    """
+    Return the people of `parents`, a person -> (mother, father) mapping,
+    ordered so that everyone comes after their parents.
+    """
+    order = []
+    placed = set()
+    for person in parents:
+        stack = [person]
+        while stack:
+            person = stack[-1]
+            if person in placed:
+                stack.pop()
+                continue
+            missing = [parent for parent in parents[person]
+                       if parent is not None and parent not in placed]
+            if missing:
+                stack.extend(missing)
+            else:
+                placed.add(person)
+                order.append(person)
+                stack.pop()
+    return order
@@ -0,0 +1,273 @@
+import multiprocessing
+import os
+
+import numpy as np
+
+from inheritance import inheritance_table, parents_first
+
+# Gene counts, which are also the index of each count along a table axis
+GENES = (0, 1, 2)
+
+# Independent chains run side by side; their spread gives the standard error
+CHAINS = 64
+
+# Sweeps each chain runs before its states are counted
+BURN_IN = 200
+
+# Sweeps run between checks of the standard errors
+ROUND = 200
+
+# Sweeps after which sampling stops even if the precision was not reached
+MAX_SWEEPS = 100000
+
+# Pedigree being sampled, in each pool worker
+pedigree = None
+
+
+class Pedigree():
+    """
+    A family as arrays for sampling: people are numbered in `names`
+    order, and each person's parents and children are stored as numbers.
+    """
+
+    def __init__(self, people, probs):
+        self.names = list(people)
+        index = {person: i for i, person in enumerate(self.names)}
+        self.mothers = [index.get(people[person]["mother"]) for person in self.names]
+        self.fathers = [index.get(people[person]["father"]) for person in self.names]
+        self.traits = [people[person]["trait"] for person in self.names]
+        self.order = parents_first(dict(enumerate(zip(self.mothers, self.fathers))))
+
+        self.children = [[] for _ in self.names]
+        for child, mother in enumerate(self.mothers):
+            if mother is not None:
+                self.children[mother].append(child)
+                self.children[self.fathers[child]].append(child)
+
+        self.gene_table = np.array([probs["gene"][gene] for gene in GENES])
+        self.trait_table = np.array([[probs["trait"][gene][False], probs["trait"][gene][True]]
+                                     for gene in GENES])
+        self.inherit_table = inheritance_table(probs)
+
+        # People who share no factor are independent given everyone else,
+        # so each color of a greedy coloring is redrawn in one go
+        neighbors = [set() for _ in self.names]
+        for child, (mother, father) in enumerate(zip(self.mothers, self.fathers)):
+            if mother is not None:
+                family = (child, mother, father)
+                for member in family:
+                    neighbors[member].update(other for other in family if other != member)
+        colors = {}
+        for person in self.order:
+            used = {colors[neighbor] for neighbor in neighbors[person] if neighbor in colors}
+            colors[person] = min(set(range(len(used) + 1)) - used)
+        self.groups = [
+            Group(self, [person for person in self.order if colors[person] == color])
+            for color in range(max(colors.values(), default=-1) + 1)
+        ]
+
+    def __len__(self):
+        return len(self.names)
+
+    def start(self, chains, rng):
+        """
+        Return `chains` gene assignments drawn from the prior, parents
+        first, ignoring the observed traits.
+        """
+        genes = np.zeros((chains, len(self)), dtype=np.int64)
+        for person in self.order:
+            mother, father = self.mothers[person], self.fathers[person]
+            if mother is None:
+                weights = np.broadcast_to(self.gene_table, (chains, 3))
+            else:
+                weights = self.inherit_table[:, genes[:, mother], genes[:, father]].T
+            genes[:, person] = draw(weights, rng)
+        return genes
+
+    def sweep(self, genes, rng):
+        """
+        Redraw every person's gene count in every chain from its
+        distribution given everyone else's, a group at a time.
+        """
+        for group in self.groups:
+            genes[:, group.people] = draw(group.weights(self, genes), rng)
+
+
+class Group():
+    """
+    People of a pedigree that share no factor, with the parents, children
+    and co-parents their gene distributions depend on as arrays.
+    """
+
+    def __init__(self, pedigree, people):
+        self.people = np.array(people)
+        self.founders = [i for i, person in enumerate(people) if pedigree.mothers[person] is None]
+        self.children = [i for i, person in enumerate(people) if pedigree.mothers[person] is not None]
+        self.mothers = [pedigree.mothers[people[i]] for i in self.children]
+        self.fathers = [pedigree.fathers[people[i]] for i in self.children]
+        self.evidence = np.array([
+            np.ones(3) if pedigree.traits[person] is None
+            else pedigree.trait_table[:, int(pedigree.traits[person])]
+            for person in people
+        ])
+
+        # Every (position in group, child, other parent) where the person
+        # is the child's mother, then where they are the father
+        self.as_mother = ([], [], [])
+        self.as_father = ([], [], [])
+        for i, person in enumerate(people):
+            for child in pedigree.children[person]:
+                if pedigree.mothers[child] == person:
+                    link, other = self.as_mother, pedigree.fathers[child]
+                else:
+                    link, other = self.as_father, pedigree.mothers[child]
+                for column, value in zip(link, (i, child, other)):
+                    column.append(value)
+
+    def weights(self, pedigree, genes):
+        """
+        Return the unnormalized distribution of each person's gene count
+        given everyone else's, as chains x people x gene counts.
+        """
+        chains = len(genes)
+        everyone = np.arange(3)
+        weights = np.empty((chains, len(self.people), 3))
+        weights[:, self.founders] = pedigree.gene_table
+        weights[:, self.children] = np.moveaxis(
+            pedigree.inherit_table[:, genes[:, self.mothers], genes[:, self.fathers]], 0, -1)
+        weights *= self.evidence
+
+        for (positions, children, others), axis in ((self.as_mother, 1), (self.as_father, 2)):
+            if not positions:
+                continue
+            child_genes = genes[:, children][..., None]
+            other_genes = genes[:, others][..., None]
+            if axis == 1:
+                terms = pedigree.inherit_table[child_genes, everyone, other_genes]
+            else:
+                terms = pedigree.inherit_table[child_genes, other_genes, everyone]
+            np.multiply.at(weights, (slice(None), positions), terms)
+        return weights
+
+
+def draw(weights, rng):
+    """
+    Return one index per row of the last axis of `weights`, drawn in
+    proportion to the row.
+    """
+    cumulative = np.cumsum(weights, axis=-1)
+    picks = rng.random(weights.shape[:-1]) * cumulative[..., -1]
+    return (picks[..., None] >= cumulative[..., :-1]).sum(axis=-1)
+
+
+def sample_probabilities(people, probs, precision, workers=None, chains=CHAINS, seed=None):
+    """
+    Estimate each person's gene and trait distribution by Gibbs sampling
+    of gene counts given the observed traits.
+
+    `chains` independent chains start from the prior and run BURN_IN
+    sweeps before they are counted, then ROUND sweeps at a time until the
+    standard error of every estimate, from the spread between the chains'
+    own estimates, is at most `precision`, or MAX_SWEEPS is reached. The
+    chains are split over `workers` processes (one per core by default).
+    Unknown traits are estimated from the gene counts of each state
+    rather than sampled.
+
+    Return (probabilities, standard errors), both in the dictionary shape
+    `heredity.infer` returns.
+    """
+    family = Pedigree(people, probs)
+    workers = min(workers or os.cpu_count(), chains)
+    entropy = np.random.SeedSequence(seed).entropy
+    groups = np.array_split(np.arange(chains), workers)
+    states = [None] * len(groups)
+    gene_counts = np.zeros((chains, len(family), 3))
+    trait_counts = np.zeros((chains, len(family)))
+    sweeps = 0
+
+    pool = None
+    if workers > 1:
+        pool = multiprocessing.Pool(workers, initializer=set_pedigree, initargs=(family,))
+    try:
+        while True:
+            jobs = [
+                (states[i], len(group), BURN_IN if sweeps == 0 else 0, ROUND, (entropy, sweeps, i))
+                for i, group in enumerate(groups)
+            ]
+            if pool is None:
+                set_pedigree(family)
+                results = [run_chains(job) for job in jobs]
+            else:
+                results = pool.map(run_chains, jobs)
+            for i, (state, genes, traits) in enumerate(results):
+                states[i] = state
+                gene_counts[groups[i]] += genes
+                trait_counts[groups[i]] += traits
+            sweeps += ROUND
+
+            probabilities, errors = estimates(family, gene_counts / sweeps, trait_counts / sweeps)
+            if errors.max() <= precision or sweeps >= MAX_SWEEPS:
+                break
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    return as_dictionaries(family, probabilities), as_dictionaries(family, errors)
+
+
+def set_pedigree(value):
+    global pedigree
+
+    pedigree = value
+
+
+def run_chains(job):
+    """
+    Continue a group of chains (or start them, if `state` is None) for
+    `burn_in` uncounted and then `sweeps` counted sweeps.
+
+    Return (state, gene counts, trait sums): how often each chain had
+    each gene count per person, and the probability of the trait summed
+    over each chain's states.
+    """
+    state, chains, burn_in, sweeps, seed = job
+    rng = np.random.default_rng(list(seed))
+    genes = pedigree.start(chains, rng) if state is None else state
+    for _ in range(burn_in):
+        pedigree.sweep(genes, rng)
+
+    gene_counts = np.zeros((chains, len(pedigree), 3))
+    trait_sums = np.zeros((chains, len(pedigree)))
+    rows = np.arange(chains)[:, None]
+    columns = np.arange(len(pedigree))[None, :]
+    for _ in range(sweeps):
+        pedigree.sweep(genes, rng)
+        gene_counts[rows, columns, genes] += 1
+        trait_sums += pedigree.trait_table[genes, 1]
+    return genes, gene_counts, trait_sums
+
+
+def estimates(pedigree, gene_frequencies, trait_frequencies):
+    """
+    Return (estimates, standard errors) as arrays of person x (gene 0,
+    gene 1, gene 2, trait False, trait True), from each chain's gene
+    frequencies and trait probabilities.
+    """
+    per_chain = np.concatenate([gene_frequencies, 1 - trait_frequencies[..., None],
+                                trait_frequencies[..., None]], axis=2)
+    for person, trait in enumerate(pedigree.traits):
+        if trait is not None:
+            per_chain[:, person, 3:] = [not trait, trait]
+    errors = per_chain.std(axis=0, ddof=1) / np.sqrt(len(per_chain))
+    return per_chain.mean(axis=0), errors
+
+
+def as_dictionaries(pedigree, values):
+    return {
+        person: {
+            "gene": {gene: float(values[i, gene]) for gene in reversed(GENES)},
+            "trait": {True: float(values[i, 4]), False: float(values[i, 3])}
+        }
+        for i, person in enumerate(pedigree.names)
+    }
@@ -0,0 +1,238 @@
+import argparse
+import itertools
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import pagerank
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; memory is then left out of the report
+    resource = None
+
+# Shapes of corpus synthetic_corpus can generate
+KINDS = ("power-law", "random", "dangling", "disconnected")
+
+# iterate_pagerank runs, as (engine, acceleration)
+SOLVERS = [("sparse", None), ("sparse", "aitken"), ("sparse", "gauss-seidel"),
+           ("partitioned", None), ("python", None)]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        usage="python benchmark.py [--kinds KIND ...] [--pages N] [--links L]"
+    )
+    parser.add_argument("--kinds", nargs="+", choices=KINDS, default=list(KINDS))
+    parser.add_argument("--pages", type=int, default=10000)
+    parser.add_argument("--links", type=int, default=8,
+                        help="average number of links per page")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed for the generated corpora")
+    parser.add_argument("--samples", type=int, default=pagerank.SAMPLES)
+    parser.add_argument("--samplers", nargs="+", choices=pagerank.SAMPLERS, default=["vector"])
+    parser.add_argument("--solvers", nargs="+", default=["sparse", "sparse/aitken",
+                                                         "sparse/gauss-seidel", "partitioned"],
+                        help="engine or engine/acceleration pairs, from: " +
+                        ", ".join(solver_name(*solver) for solver in SOLVERS))
+    parser.add_argument("--workers", type=int,
+                        help="processes for the crawl pool and the partitioned solver")
+    parser.add_argument("--sample-tolerance", type=float, default=0.01,
+                        help="largest difference allowed between a sampled and an iterated rank")
+    parser.add_argument("--changed-fraction", type=float, default=0.0001,
+                        help="fraction of pages given new links for the incremental update check, "
+                        "0 to skip")
+    args = parser.parse_args()
+
+    solvers = {solver_name(*solver): solver for solver in SOLVERS}
+    for name in args.solvers:
+        if name not in solvers:
+            parser.error(f"unknown solver: {name}")
+
+    failures = 0
+    for kind in args.kinds:
+        print(f"Generating a {kind} corpus of {args.pages} pages...")
+        corpus = synthetic_corpus(kind, args.pages, args.links, args.seed)
+        failures += run(corpus, args, [solvers[name] for name in args.solvers])
+    if failures:
+        sys.exit(f"{failures} checks failed")
+
+
+def synthetic_corpus(kind, num_pages, links, seed, components=10):
+    """
+    Generate a `crawl` style corpus of `num_pages` pages with about
+    `links` links each on average.
+
+    "random" pages link to pages picked uniformly. "power-law" pages pick
+    about half their links from the targets of earlier links, so pages
+    are linked to in proportion to how often they already are. "dangling"
+    is random with half the pages given no links at all. "disconnected"
+    is random within `components` groups of pages that never link to one
+    another.
+    """
+    rng = random.Random(seed)
+    names = [f"{page}.html" for page in range(num_pages)]
+    group_size = -(-num_pages // components)
+    targets = []
+    corpus = {}
+    for page, name in enumerate(names):
+        count = min(num_pages - 1, round(rng.expovariate(1 / links)))
+        if kind == "dangling":
+            count = 0 if rng.random() < 0.5 else 2 * count
+        page_links = set()
+        for _ in range(count):
+            if kind == "power-law" and targets and rng.random() < 0.5:
+                target = rng.choice(targets)
+            elif kind == "disconnected":
+                group = page // group_size * group_size
+                target = rng.randrange(group, min(num_pages, group + group_size))
+            else:
+                target = rng.randrange(num_pages)
+            targets.append(target)
+            page_links.add(names[target])
+        page_links.discard(name)
+        corpus[name] = page_links
+    return corpus
+
+
+def write_corpus(corpus, directory):
+    """
+    Write a corpus as one HTML file per page into `directory`.
+    """
+    for page, links in corpus.items():
+        with open(os.path.join(directory, page), "w") as f:
+            f.write("<!DOCTYPE html>\n<html>\n<body>\n")
+            for link in sorted(links):
+                f.write(f'<a href="{link}">{link}</a>\n')
+            f.write("</body>\n</html>\n")
+
+
+def solver_name(engine, acceleration):
+    return engine if acceleration is None else f"{engine}/{acceleration}"
+
+
+def run(corpus, args, solvers):
+    """
+    Time crawling, sampling and iterating one corpus, checking every
+    answer against the first solver's. Return the number of runs that
+    disagreed.
+    """
+    num_links = sum(len(links) for links in corpus.values())
+    print(f"{len(corpus)} pages, {num_links} links")
+
+    with tempfile.TemporaryDirectory() as directory:
+        write_corpus(corpus, directory)
+        start = time.perf_counter()
+        graph = pagerank.crawl_graph(directory, args.workers)
+        report("crawl", time.perf_counter() - start, num_links, "links")
+
+    failures = 0
+    reference = None
+    for engine, acceleration in solvers:
+        steps = []
+        pagerank.solve_hook = steps.append
+        start = time.perf_counter()
+        try:
+            if engine == "partitioned":
+                solution = pagerank.partitioned_iteration(graph, pagerank.DAMPING,
+                                                          pagerank.TOLERANCE, args.workers)
+                ranks = graph.ranks(solution.rank)
+            else:
+                ranks = pagerank.iterate_pagerank(graph, pagerank.DAMPING, engine=engine,
+                                                  acceleration=acceleration)
+        finally:
+            pagerank.solve_hook = None
+        seconds = time.perf_counter() - start
+        name = solver_name(engine, acceleration)
+        if steps:
+            iterations = steps[-1].iterations
+            report(name, seconds, iterations * num_links, "links", f"{iterations} steps")
+        else:
+            report(name, seconds, num_links, "links")
+
+        if reference is None:
+            reference = ranks
+            continue
+        distance = sum(abs(ranks[page] - reference[page]) for page in reference)
+        print(f"  L1 distance from {solver_name(*solvers[0])}: {distance:.2e}")
+        if distance > 100 * pagerank.TOLERANCE:
+            print(f"  disagrees with {solver_name(*solvers[0])}")
+            failures += 1
+
+    for sampler in args.samplers:
+        start = time.perf_counter()
+        ranks = pagerank.sample_pagerank(graph, pagerank.DAMPING, args.samples, engine=sampler)
+        report(f"sample {sampler}", time.perf_counter() - start, args.samples, "samples")
+        if reference is not None:
+            worst = max(abs(ranks[page] - reference[page]) for page in reference)
+            print(f"  largest difference from {solver_name(*solvers[0])}: {worst:.4f}")
+            if worst > args.sample_tolerance:
+                print(f"  disagrees with {solver_name(*solvers[0])}")
+                failures += 1
+
+    if args.changed_fraction:
+        num_changes = max(1, round(args.changed_fraction * len(graph)))
+        failures += check_update(graph, num_changes, args.seed)
+    return failures
+
+
+def check_update(graph, num_changes, seed, repeats=5):
+    """
+    Time update_pagerank after giving `num_changes` pages new links,
+    against patching the graph the same way and re-solving it by power
+    iteration started from the old ranks. Return 1 if the update is
+    slower or disagrees, 0 otherwise; each is timed at its best of
+    `repeats` runs.
+    """
+    rng = random.Random(seed)
+    names = list(graph.pages)
+    changes = {
+        page: {names[target] for target in rng.sample(range(len(names)), min(8, len(names)))}
+        for page in rng.sample(names, min(num_changes, len(names)))
+    }
+    ranks = graph.ranks(pagerank.power_iteration(graph, pagerank.DAMPING, pagerank.TOLERANCE).rank)
+
+    update_seconds = warm_seconds = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        _, updated = pagerank.update_pagerank(graph, ranks, changes, pagerank.DAMPING)
+        update_seconds = min(update_seconds, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        patched = graph.patched(changes)
+        rank = np.fromiter(map(ranks.get, patched.pages, itertools.repeat(1 / len(patched))),
+                           dtype=float, count=len(patched))
+        solution = pagerank.power_iteration(patched, pagerank.DAMPING, pagerank.TOLERANCE,
+                                            rank=rank / rank.sum())
+        warm = patched.ranks(solution.rank)
+        warm_seconds = min(warm_seconds, time.perf_counter() - start)
+
+    report(f"update after {len(changes)} changes", update_seconds, len(changes), "changes")
+    report("warm-started power iteration", warm_seconds, len(changes), "changes",
+           f"{solution.iterations} steps")
+    distance = sum(abs(updated[page] - warm[page]) for page in warm)
+    print(f"  L1 distance from update: {distance:.2e}")
+    if distance > 100 * pagerank.TOLERANCE or update_seconds > warm_seconds:
+        print("  update is slower than a warm-started solve or disagrees with it")
+        return 1
+    return 0
+
+
+def report(name, seconds, count, unit, detail=None):
+    print(f"{name}:")
+    print(f"  seconds: {seconds:.3f}" + (f" ({detail})" if detail else ""))
+    print(f"  throughput: {count / max(seconds, 1e-9):,.0f} {unit}/sec")
+    if resource is not None:
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        scale = 1 if sys.platform == "darwin" else 1024
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+        print(f"  memory high-water mark: {peak / 2 ** 20:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+import bisect
+import json
+import mmap
+import sys
+
+import numpy as np
+
+try:
+    import scipy.sparse
+except ImportError:
+    # Without SciPy, blocks of vectors are followed one row at a time
+    scipy = None
+
+# First bytes of every saved link graph
+MAGIC = b"PRGRAPH1"
+
+# Sections are padded so every array starts on an 8 byte boundary
+ALIGN = 8
+
+
+class LinkGraph():
+    """
+    Link structure of a corpus with pages numbered in sorted name order.
+
+    The pages that page i links to are targets[offsets[i]:offsets[i + 1]],
+    CSR style, so the whole graph is two NumPy arrays plus the page names.
+    """
+
+    def __init__(self, pages, offsets, targets):
+        self.pages = pages
+        self.offsets = offsets
+        self.targets = targets
+        # Per-link source pages and weights, built by `follow` on first use
+        self.link_sources = None
+        self.link_weights = None
+        # The same links grouped by target page, built by `inlinks`
+        self.inlink_table = None
+        # SciPy CSR matrix of those, built by `follow` for blocks of vectors
+        self.link_matrix = None
+
+    @classmethod
+    def from_corpus(cls, corpus):
+        """
+        Build a graph from a `crawl` style dictionary of page -> linked
+        pages. Links to pages outside the corpus and links from a page to
+        itself are ignored.
+        """
+        pages = sorted(corpus)
+        index = {page: i for i, page in enumerate(pages)}
+        offsets = [0]
+        targets = []
+        for i, page in enumerate(pages):
+            links = {index[link] for link in corpus[page] if link in index}
+            links.discard(i)
+            targets.extend(sorted(links))
+            offsets.append(len(targets))
+        return cls(pages, np.array(offsets, dtype=np.int64), np.array(targets, dtype=np.int32))
+
+    def patched(self, changes):
+        """
+        Return a new graph with `changes` applied: page -> its new linked
+        pages, or None for a page that was removed, as `crawl_diff` gives.
+
+        Only the changed pages' links are looked up by name. Every other
+        page's links are copied over as arrays, renumbered if pages were
+        added or removed, with the links to removed pages dropped.
+        """
+        removed = []
+        changed = {}
+        for page, links in changes.items():
+            if links is None:
+                try:
+                    removed.append(self.index(page))
+                except KeyError:
+                    pass
+            else:
+                changed[page] = links
+
+        # New number of each old page, -1 for removed ones. Both lists are
+        # sorted, so each kept page moves up by the number of pages added
+        # before it
+        n = len(self)
+        kept = np.ones(n, dtype=bool)
+        kept[removed] = False
+        added = sorted(page for page in changed if page not in self)
+        if removed or added:
+            remaining = [page for page, keep in zip(self.pages, kept.tolist()) if keep]
+            pages = sorted(remaining + added)
+            shift = np.zeros(len(remaining) + 1, dtype=np.int64)
+            for page in added:
+                shift[bisect.bisect_left(remaining, page)] += 1
+            renumber = np.full(n, -1, dtype=np.int64)
+            renumber[kept] = np.arange(len(remaining)) + np.cumsum(shift)[:-1]
+        else:
+            pages = self.pages
+            renumber = np.arange(n)
+        index = {page: bisect.bisect_left(pages, page) for page in changed}
+
+        # Links of changed pages, by name, as from_corpus would read them
+        rewritten = np.zeros(len(pages), dtype=bool)
+        new_rows = {}
+        for page, links in changed.items():
+            row = index[page]
+            numbers = {bisect.bisect_left(pages, link) for link in links}
+            rewritten[row] = True
+            new_rows[row] = sorted(number for number in numbers
+                                   if number != row and number < len(pages)
+                                   and pages[number] in links)
+
+        # Every other link is kept in order, so rows stay sorted
+        sources = renumber[self.sources()]
+        targets = renumber[self.targets]
+        keep = (sources >= 0) & (targets >= 0)
+        keep[keep] = ~rewritten[sources[keep]]
+        sources = sources[keep]
+        targets = targets[keep]
+
+        degrees = np.bincount(sources, minlength=len(pages))
+        for row, links in new_rows.items():
+            degrees[row] = len(links)
+        offsets = np.zeros(len(pages) + 1, dtype=np.int64)
+        np.cumsum(degrees, out=offsets[1:])
+        new_targets = np.empty(offsets[-1], dtype=np.int32)
+        kept_starts = np.zeros(len(pages) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=len(pages)), out=kept_starts[1:])
+        new_targets[offsets[sources] + np.arange(len(sources)) - kept_starts[sources]] = targets
+        for row, links in new_rows.items():
+            new_targets[offsets[row]:offsets[row + 1]] = links
+        return LinkGraph(pages, offsets, new_targets)
+
+    def __contains__(self, page):
+        i = bisect.bisect_left(self.pages, page)
+        return i < len(self) and self.pages[i] == page
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Memory-map a graph written by `save`. The offsets and targets are
+        read-only arrays over the mapped file and page names are decoded
+        on access, so loading does not depend on the size of the graph.
+        Raise ValueError if the file is not a saved graph for this machine.
+        """
+        with open(filename, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if mapped[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{filename} is not a saved link graph")
+        header_end = len(MAGIC) + 8
+        header_size = int.from_bytes(mapped[len(MAGIC):header_end], "little")
+        header = json.loads(mapped[header_end:header_end + header_size])
+        if header["byteorder"] != sys.byteorder:
+            raise ValueError(f"{filename} was written on a {header['byteorder']}-endian machine")
+        body_start = header_end + header_size
+        body_start += -body_start % ALIGN
+
+        def section(name, dtype, count):
+            return np.frombuffer(mapped, dtype=dtype, count=count,
+                                 offset=body_start + header[name])
+
+        pages = header["pages"]
+        names = PageTable(section("name_offsets", np.int64, pages + 1),
+                          memoryview(mapped)[body_start + header["names"]:])
+        return cls(names, section("offsets", np.int64, pages + 1),
+                   section("targets", np.int32, header["links"]))
+
+    def save(self, filename):
+        """
+        Write the graph to a binary file that `load` can map back in: a
+        JSON header, then the page names as one utf-8 blob with an array
+        of offsets into it, then the offsets and targets arrays as is.
+        """
+        encoded = [page.encode("utf-8") for page in self.pages]
+        name_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(name) for name in encoded], out=name_offsets[1:])
+        chunks = [
+            ("name_offsets", name_offsets.tobytes()),
+            ("offsets", np.asarray(self.offsets, dtype=np.int64).tobytes()),
+            ("targets", np.asarray(self.targets, dtype=np.int32).tobytes()),
+            ("names", b"".join(encoded))
+        ]
+
+        layout = {"byteorder": sys.byteorder, "pages": len(self), "links": len(self.targets)}
+        position = 0
+        for name, data in chunks:
+            position += -position % ALIGN
+            layout[name] = position
+            position += len(data)
+        header = json.dumps(layout).encode("utf-8")
+        body_start = len(MAGIC) + 8 + len(header)
+        body_start += -body_start % ALIGN
+
+        with open(filename, "wb") as f:
+            f.write(MAGIC)
+            f.write(len(header).to_bytes(8, "little"))
+            f.write(header)
+            for name, data in chunks:
+                f.seek(body_start + layout[name])
+                f.write(data)
+
+    def __len__(self):
+        return len(self.pages)
+
+    def out_degrees(self):
+        return np.diff(self.offsets)
+
+    def sources(self):
+        """
+        Return the linking page of every link, aligned with `targets`.
+        """
+        return np.repeat(np.arange(len(self), dtype=np.int32), self.out_degrees())
+
+    def spread(self, vector):
+        """
+        Return P @ vector for the column-stochastic link matrix P, where
+        each page splits its value evenly over its links and pages with no
+        links split theirs over every page.
+
+        The product is one weighted bincount over the links; the pages
+        without links add a single uniform term instead of dense columns.
+        """
+        return self.follow(vector) + vector[self.out_degrees() == 0].sum() / len(self)
+
+    def follow(self, values):
+        """
+        Return what each page receives when every page splits its value
+        evenly over its links, leaving out pages with no links.
+
+        `values` is a vector, or a matrix with one vector per row. A matrix
+        is multiplied in one sparse matrix product when SciPy is available,
+        reading the links once for all rows.
+        """
+        if values.ndim == 2:
+            if scipy is None:
+                return np.stack([self.follow(row) for row in values])
+            if self.link_matrix is None:
+                offsets, sources, weights = self.inlinks()
+                self.link_matrix = scipy.sparse.csr_matrix((weights, sources, offsets),
+                                                           shape=(len(self), len(self)))
+            return np.asarray((self.link_matrix @ values.T).T)
+        if self.link_sources is None:
+            self.link_sources = self.sources()
+            self.link_weights = 1 / self.out_degrees()[self.link_sources]
+        return np.bincount(self.targets, weights=values[self.link_sources] * self.link_weights,
+                           minlength=len(self))
+
+    def inlinks(self):
+        """
+        Return (offsets, sources, weights) such that the links into page i
+        come from pages sources[offsets[i]:offsets[i + 1]], each carrying
+        the matching weight, 1 / the linking page's number of links.
+        """
+        if self.inlink_table is None:
+            order = np.argsort(self.targets, kind="stable")
+            sources = self.sources()[order]
+            offsets = np.zeros(len(self) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(self.targets, minlength=len(self)), out=offsets[1:])
+            self.inlink_table = offsets, sources, 1 / self.out_degrees()[sources]
+        return self.inlink_table
+
+    def index(self, page):
+        """
+        Return the number of `page`, found by bisecting the sorted page
+        names so a loaded graph need not decode them all.
+        """
+        i = bisect.bisect_left(self.pages, page)
+        if i == len(self) or self.pages[i] != page:
+            raise KeyError(page)
+        return i
+
+    def corpus(self):
+        """
+        Return the graph as a `crawl` style dictionary of page -> set of
+        linked pages.
+        """
+        return {
+            page: {self.pages[target] for target in self.targets[self.offsets[i]:self.offsets[i + 1]]}
+            for i, page in enumerate(self.pages)
+        }
+
+    def ranks(self, vector):
+        """
+        Return a page -> rank dictionary for a rank vector.
+        """
+        return dict(zip(self.pages, np.asarray(vector, dtype=float).tolist()))
+
+
+class PageTable():
+    """
+    Read-only sequence of page names decoded on access from a utf-8 blob,
+    where name i is blob[offsets[i]:offsets[i + 1]].
+    """
+
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return str(self.blob[self.offsets[i]:self.offsets[i + 1]], "utf-8")
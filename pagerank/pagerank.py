@@ -1,24 +1,122 @@
+import argparse
+import itertools
+import mmap
+import multiprocessing
 import os
 import random
 import re
-import sys
+import time
+from collections import deque
+from collections.abc import Mapping
+from multiprocessing.shared_memory import SharedMemory
+
 import numpy as np
 
+from linkgraph import LinkGraph
+
 DAMPING = 0.85
 SAMPLES = 10000
 
-# Haven't set up a system for dealing with identical links on same page yet.
+# Iteration stops once the total (L1) change in rank falls below this
+TOLERANCE = .00001
+
+# update_pagerank pushes just the pages that need it until more than
+# this fraction of them do, then hands over to power_iteration
+PUSH_FRACTION = .1
+
+# Pages are pushed once their residual exceeds this many times an even
+# share of the tolerance
+PUSH_THRESHOLD = 10
+
+# Solvers understood by iterate_pagerank
+ENGINES = ("sparse", "partitioned", "python")
+
+# Stopping rules for power_iteration: total (L1) or largest change
+CRITERIA = ("l1", "max")
+
+# Ways power_iteration can speed up convergence, besides plain steps
+ACCELERATIONS = ("aitken", "gauss-seidel")
+
+# Steps between Aitken extrapolations
+AITKEN_PERIOD = 10
+
+# Blocks of pages updated in turn by each Gauss-Seidel sweep
+GAUSS_SEIDEL_BLOCKS = 32
+
+# Called with the Convergence so far after every power_iteration step
+solve_hook = None
+
+# Samplers understood by sample_pagerank
+SAMPLERS = ("vector", "python")
+
+# Random surfers walked side by side by the vector sampler, split into
+# independent batches whose spread gives the standard error
+SURFERS = 1000
+BATCHES = 10
+
+# Steps each surfer takes before its visits are counted
+BURN_IN = 50
+
+# Solvers understood by personalized_pagerank
+PERSONALIZED_ENGINES = ("block", "push", "walk")
+
+# Seed sets solved together by one blocked power iteration
+SEED_BLOCK = 64
+
+# Matches the target of each <a href="..."> link in a page's raw bytes
+LINK = re.compile(rb"<a\s+(?:[^>]*?)href=\"([^\"]*)\"")
+
+# Corpora with fewer pages than this are crawled without a process pool
+POOL_MIN_PAGES = 1000
+
+# Pages at least this large are memory-mapped instead of read whole
+MMAP_MIN_BYTES = 1 << 20
+
+# Page numbers of the corpus being crawled, in each pool worker
+crawl_index = None
+
+# Shared arrays of the graph being ranked, in each pool worker
+partition = None
+
 
 def main():
-    if len(sys.argv) != 2:
-        sys.exit("Usage: python pagerank.py corpus")
-    corpus = crawl(sys.argv[1])
-    ranks = sample_pagerank(corpus, DAMPING, SAMPLES)
-    print(f"PageRank Results from Sampling (n = {SAMPLES})")
-    for page in sorted(ranks):
-        print(f"  {page}: {ranks[page]:.4f}")
-    ranks = iterate_pagerank(corpus, DAMPING)
-    print(f"PageRank Results from Iteration")
+    parser = argparse.ArgumentParser(
+        usage="python pagerank.py corpus [--save FILE] [--damping D]"
+    )
+    parser.add_argument("corpus",
+                        help="directory of HTML pages, or a graph file written by --save")
+    parser.add_argument("--save", metavar="FILE",
+                        help="write the crawled link graph to FILE for later runs")
+    parser.add_argument("--damping", type=float, default=DAMPING)
+    parser.add_argument("--samples", type=int, default=SAMPLES)
+    parser.add_argument("--criterion", choices=CRITERIA, default="l1")
+    parser.add_argument("--acceleration", choices=ACCELERATIONS)
+    parser.add_argument("--workers", type=int, metavar="N",
+                        help="rank with the partitioned solver on N processes")
+    args = parser.parse_args()
+    if args.workers and args.acceleration:
+        parser.error("--acceleration is not supported by the partitioned solver (--workers)")
+
+    if os.path.isdir(args.corpus):
+        graph = crawl_graph(args.corpus)
+    else:
+        graph = LinkGraph.load(args.corpus)
+    if args.save:
+        graph.save(args.save)
+
+    ranks, errors = surf(graph, args.damping, args.samples)
+    print(f"PageRank Results from Sampling (n = {args.samples})")
+    for i, page in enumerate(graph.pages):
+        print(f"  {page}: {ranks[i]:.4f} (± {errors[i]:.4f})")
+    if args.workers:
+        solution = partitioned_iteration(graph, args.damping, TOLERANCE, args.workers,
+                                         criterion=args.criterion)
+    else:
+        solution = power_iteration(graph, args.damping, TOLERANCE, criterion=args.criterion,
+                                   acceleration=args.acceleration)
+    ranks = graph.ranks(solution.rank)
+    print(f"PageRank Results from Iteration ({solution.iterations} steps, "
+          f"residual {solution.residuals[-1]:.2e}, {solution.seconds:.3f}s)")
     for page in sorted(ranks):
         print(f"  {page}: {ranks[page]:.4f}")
 
@@ -29,25 +127,68 @@ def crawl(directory):
     Return a dictionary where each key is a page, and values are
     a list of all other pages in the corpus that are linked to by the page.
     """
-    pages = dict()
+    return crawl_graph(directory).corpus()
+
+
+def crawl_graph(directory, workers=None):
+    """
+    Parse a directory of HTML pages straight into a LinkGraph.
+
+    Pages are numbered before any is read, so each page's links become
+    page numbers as it is scanned, with repeated links, links to itself
+    and links outside the corpus dropped. Corpora of POOL_MIN_PAGES or
+    more are scanned by a pool of `workers` processes (one per core by
+    default) unless `workers` is 1.
+    """
+    pages = sorted(
+        entry.name for entry in os.scandir(directory)
+        if entry.name.endswith(".html") and entry.is_file()
+    )
+    index = {page: i for i, page in enumerate(pages)}
+    jobs = [(os.path.join(directory, page), i) for i, page in enumerate(pages)]
+
+    if len(pages) < POOL_MIN_PAGES or workers == 1:
+        links = [page_links(path, page, index) for path, page in jobs]
+    else:
+        workers = workers or os.cpu_count()
+        with multiprocessing.Pool(workers, initializer=set_crawl_index,
+                                  initargs=(index,)) as pool:
+            links = pool.map(scan_page, jobs, chunksize=max(1, len(jobs) // (4 * workers)))
+
+    offsets = np.zeros(len(pages) + 1, dtype=np.int64)
+    np.cumsum([len(targets) for targets in links], out=offsets[1:])
+    targets = np.fromiter(itertools.chain.from_iterable(links), dtype=np.int32, count=offsets[-1])
+    return LinkGraph(pages, offsets, targets)
+
+
+def page_links(path, page, index):
+    """
+    Return the sorted numbers of the other pages in `index` that the
+    page at `path`, numbered `page`, links to. Files of MMAP_MIN_BYTES or
+    more are memory-mapped and scanned in place rather than read in.
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0 or size < MMAP_MIN_BYTES:
+            links = LINK.findall(f.read())
+        else:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as contents:
+                links = LINK.findall(contents)
+    targets = {index.get(link.decode()) for link in links}
+    targets.discard(None)
+    targets.discard(page)
+    return sorted(targets)
 
-    # Extract all links from HTML files
-    for filename in os.listdir(directory):
-        if not filename.endswith(".html"):
-            continue
-        with open(os.path.join(directory, filename)) as f:
-            contents = f.read()
-            links = re.findall(r"<a\s+(?:[^>]*?)href=\"([^\"]*)\"", contents)
-            pages[filename] = set(links) - {filename}
 
-    # Only include links to other pages in the corpus
-    for filename in pages:
-        pages[filename] = set(
-            link for link in pages[filename]
-            if link in pages
-        )
+def set_crawl_index(index):
+    global crawl_index
 
-    return pages
+    crawl_index = index
+
+
+def scan_page(job):
+    path, page = job
+    return page_links(path, page, crawl_index)
 
 
 def transition_model(corpus, page, damping_factor):
@@ -58,69 +199,687 @@ def transition_model(corpus, page, damping_factor):
     With probability `damping_factor`, choose a link at random
     linked to by `page`. With probability `1 - damping_factor`, choose
     a link at random chosen from all pages in the corpus.
+
+    The distribution is a read-only mapping from every page to its
+    probability, worked out on lookup rather than stored for each page.
     """
+    return TransitionModel(corpus, damping_factor).row(page)
 
-    transition_dist = {}
 
-    minimum_prob = (1-damping_factor)/len(corpus)
-    if len(corpus[page]) != 0:
-        inv_num_links = 1/len(corpus[page])
-        for site in corpus:
-            if site in corpus[page] and site is not page:
-                transition_dist[site] = minimum_prob + damping_factor*inv_num_links
-            else:
-                transition_dist[site] = minimum_prob
-    else:
-        for site in corpus:
-            transition_dist[site] = 1/len(corpus)
-    sum = 0
-    for site in transition_dist.keys():
-        sum += transition_dist[site]
-    if sum < .99:
-        for site in transition_dist.keys():
-            transition_dist[site] = transition_dist[site]/sum
-    return transition_dist
-
-def sample_pagerank(corpus, damping_factor, n):
+class TransitionModel():
+    """
+    Transition model of a whole corpus, kept implicit: a uniform teleport
+    term plus each page's list of links, so no N-entry rows are built.
+    """
+
+    def __init__(self, corpus, damping_factor):
+        self.corpus = corpus
+        self.damping_factor = damping_factor
+        self.pages = list(corpus)
+        self.links = {}
+
+    def page_links(self, page):
+        """
+        Return the pages `page` links to, leaving out itself and pages
+        outside the corpus.
+        """
+        links = self.links.get(page)
+        if links is None:
+            links = [link for link in self.corpus[page] if link != page and link in self.corpus]
+            self.links[page] = links
+        return links
+
+    def probability(self, page, target):
+        """
+        Return the probability of moving from `page` to `target`.
+        """
+        if target not in self.corpus:
+            raise KeyError(target)
+        links = self.page_links(page)
+        if not links:
+            return 1 / len(self.pages)
+        probability = (1 - self.damping_factor) / len(self.pages)
+        if target != page and target in self.corpus[page]:
+            probability += self.damping_factor / len(links)
+        return probability
+
+    def sample(self, page):
+        """
+        Return a page picked at random according to the distribution
+        from `page`, in constant time.
+        """
+        links = self.page_links(page)
+        if links and random.random() < self.damping_factor:
+            return random.choice(links)
+        return random.choice(self.pages)
+
+    def row(self, page):
+        return Transitions(self, page)
+
+
+class Transitions(Mapping):
+    """
+    Read-only mapping from each page to the probability of moving there
+    from one page, see TransitionModel.
+    """
+
+    def __init__(self, model, page):
+        self.model = model
+        self.page = page
+
+    def __getitem__(self, target):
+        return self.model.probability(self.page, target)
+
+    def __iter__(self):
+        return iter(self.model.pages)
+
+    def __len__(self):
+        return len(self.model.pages)
+
+def sample_pagerank(corpus, damping_factor, n, engine="vector"):
     """
     Return PageRank values for each page by sampling `n` pages
     according to transition model, starting with a page at random.
 
+    `corpus` may also be a LinkGraph, such as one read by LinkGraph.load.
+    `engine` picks the sampler: "vector" walks many surfers at once over
+    the graph, see `surf`; "python" walks a single surfer.
+
     Return a dictionary where keys are page names, and values are
     their estimated PageRank value (a value between 0 and 1). All
     PageRank values should sum to 1.
     """
+    if engine == "python":
+        if isinstance(corpus, LinkGraph):
+            corpus = corpus.corpus()
+        return python_sample(corpus, damping_factor, n)
+    if engine != "vector":
+        raise ValueError(f"unknown engine: {engine}")
+    graph = corpus if isinstance(corpus, LinkGraph) else LinkGraph.from_corpus(corpus)
+    ranks, _ = surf(graph, damping_factor, n)
+    return graph.ranks(ranks)
 
-    visit_counts = {}
 
-    transition_dists = {}
-    for site in corpus:
-        transition_dists[site] = transition_model(corpus, site, damping_factor)
+def surf(graph, damping_factor, n, surfers=SURFERS, batches=BATCHES, rng=None):
+    """
+    Estimate PageRank of a LinkGraph from about `n` samples.
+
+    `surfers` random surfers start on random pages and step together as
+    NumPy vectors. Each step, a surfer follows a random link from its page
+    with probability `damping_factor`, and otherwise (or from a page with
+    no links) jumps to a page chosen uniformly. A page's links are a
+    contiguous slice of `graph.targets`, so picking one is a single random
+    offset into it. The first BURN_IN steps are not counted, so the
+    estimate does not lean towards the uniform starting pages.
+
+    Return (ranks, standard errors) as arrays aligned with `graph.pages`.
+    Surfers are split into `batches` independent groups, and the standard
+    error is the spread of the per-batch visit frequencies.
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    pages = len(graph)
+    surfers = max(batches, min(surfers, n))
+    steps = -(-n // surfers)
+    out_degrees = graph.out_degrees()
+
+    batch = np.arange(surfers) % batches
+    counts = np.zeros(batches * pages, dtype=np.int64)
+    # Visits are binned once enough have built up to be worth a bincount
+    pending = []
+    position = rng.integers(pages, size=surfers)
+    for step in range(BURN_IN + steps):
+        if step >= BURN_IN:
+            pending.append(batch * pages + position)
+            if len(pending) * surfers >= batches * pages or step == BURN_IN + steps - 1:
+                counts += np.bincount(np.concatenate(pending), minlength=batches * pages)
+                pending = []
+        degree = out_degrees[position]
+        follow = (rng.random(surfers) < damping_factor) & (degree > 0)
+        link = graph.offsets[position[follow]] + (rng.random(follow.sum()) * degree[follow]).astype(np.int64)
+        position = rng.integers(pages, size=surfers)
+        position[follow] = graph.targets[link]
+
+    frequencies = counts.reshape(batches, pages) / np.bincount(batch, minlength=batches)[:, None] / steps
+    errors = frequencies.std(axis=0, ddof=1) / np.sqrt(batches)
+    return frequencies.mean(axis=0), errors
 
-    # Add random for curr_site
-    curr_site = random.choice(list(corpus.keys()))
-    curr_dist = {}
+
+def python_sample(corpus, damping_factor, n):
+    """
+    Single surfer sampler, see sample_pagerank.
+    """
+    visit_counts = {}
+
+    model = TransitionModel(corpus, damping_factor)
+    curr_site = random.choice(model.pages)
     for i in range(n):
         visit_counts[curr_site] = visit_counts.setdefault(curr_site, 0) +1
-        curr_dist = transition_dists[curr_site]
-        curr_site = random.choices(list(curr_dist.keys()), list(curr_dist.values()))[-1]
-        
+        curr_site = model.sample(curr_site)
 
     probability_dist = {}
     for site in corpus:
         probability_dist[site] = visit_counts.setdefault(site, 0)/n
     return probability_dist
 
-def iterate_pagerank(corpus, damping_factor):
+def iterate_pagerank(corpus, damping_factor, tolerance=TOLERANCE, engine="sparse",
+                     criterion="l1", acceleration=None):
     """
     Return PageRank values for each page by iteratively updating
     PageRank values until convergence.
 
+    `corpus` may also be a LinkGraph, such as one read by LinkGraph.load.
+    `engine` picks the solver: "sparse" runs vectorized power iteration
+    over the graph, "partitioned" spreads it over a process pool (see
+    partitioned_iteration), "python" updates one page at a time.
+    `criterion` is passed on to the solver and `acceleration` to
+    power_iteration; only "sparse" supports `acceleration`.
+
     Return a dictionary where keys are page names, and values are
     their estimated PageRank value (a value between 0 and 1). All
     PageRank values should sum to 1.
     """
+    if acceleration is not None and engine != "sparse":
+        raise ValueError(f"acceleration is not supported by the {engine} engine")
+    if engine == "python":
+        if isinstance(corpus, LinkGraph):
+            corpus = corpus.corpus()
+        return python_pagerank(corpus, damping_factor, tolerance, criterion)
+    graph = corpus if isinstance(corpus, LinkGraph) else LinkGraph.from_corpus(corpus)
+    if engine == "partitioned":
+        return graph.ranks(partitioned_iteration(graph, damping_factor, tolerance,
+                                                 criterion=criterion).rank)
+    if engine != "sparse":
+        raise ValueError(f"unknown engine: {engine}")
+    solution = power_iteration(graph, damping_factor, tolerance,
+                               criterion=criterion, acceleration=acceleration)
+    return graph.ranks(solution.rank)
+
+
+class Convergence():
+    """
+    Result of a power_iteration run: the rank vector, plus how it got
+    there for diagnostics.
+
+    `residuals` holds the L1 change made by each step, whichever
+    criterion was used to stop, and `seconds` the wall time so far.
+    """
+
+    def __init__(self, rank, criterion, acceleration):
+        self.rank = rank
+        self.criterion = criterion
+        self.acceleration = acceleration
+        self.iterations = 0
+        self.residuals = []
+        self.seconds = 0
+        self.converged = False
+
+
+def power_iteration(graph, damping_factor, tolerance, rank=None, criterion="l1",
+                    acceleration=None):
+    """
+    Return the PageRank vector of a LinkGraph as a Convergence, starting
+    from `rank` if given and the uniform vector otherwise.
+
+    Each step is one sparse matrix-vector product, see LinkGraph.spread.
+    Stops when the change between steps is below `tolerance`, measured
+    as its L1 norm when `criterion` is "l1" and as the largest change of
+    any one page when it is "max".
+
+    `acceleration` "aitken" replaces every AITKEN_PERIOD-th step's result
+    with its Aitken extrapolation from the last three steps, page by page;
+    this pays off when one slowly fading error dominates and can cost
+    steps otherwise. "gauss-seidel" replaces each step with a sweep over
+    blocks of pages that uses the blocks already updated in the same
+    sweep, see `gauss_seidel_sweep`. solve_hook, if set, is called with
+    the Convergence after each step.
+    """
+    if criterion not in CRITERIA:
+        raise ValueError(f"unknown criterion: {criterion}")
+    if acceleration is not None and acceleration not in ACCELERATIONS:
+        raise ValueError(f"unknown acceleration: {acceleration}")
+    start = time.perf_counter()
+    n = len(graph)
+    rank = np.full(n, 1 / n) if rank is None else rank
+    solution = Convergence(rank, criterion, acceleration)
+    history = []
+    while not solution.converged:
+        if acceleration == "gauss-seidel":
+            new_rank = gauss_seidel_sweep(graph, rank, damping_factor)
+        else:
+            new_rank = (1 - damping_factor) / n + damping_factor * graph.spread(rank)
+        if acceleration == "aitken":
+            history = history[-1:] + [rank]
+            if len(history) == 2 and (solution.iterations + 1) % AITKEN_PERIOD == 0:
+                new_rank = aitken(history[0], history[1], new_rank)
 
+        change = np.abs(new_rank - rank)
+        rank = new_rank
+        solution.rank = rank
+        solution.iterations += 1
+        solution.residuals.append(float(change.sum()))
+        solution.converged = (change.sum() if criterion == "l1" else change.max()) < tolerance
+        solution.seconds = time.perf_counter() - start
+        if solve_hook is not None:
+            solve_hook(solution)
+    return solution
+
+
+def aitken(first, second, third):
+    """
+    Return the Aitken delta-squared extrapolation of three successive
+    rank vectors, taken page by page and renormalized. Pages whose second
+    difference is too small to divide by keep their latest value.
+    """
+    step = third - second
+    bend = step - (second - first)
+    safe = np.abs(bend) > 1e-15
+    rank = third.copy()
+    rank[safe] -= step[safe] ** 2 / bend[safe]
+    np.maximum(rank, 0, out=rank)
+    return rank / rank.sum()
+
+
+def gauss_seidel_sweep(graph, rank, damping_factor):
+    """
+    Return the rank vector after one block Gauss-Seidel sweep.
+
+    Pages are updated GAUSS_SEIDEL_BLOCKS blocks at a time, in order,
+    each block from the links into it (see LinkGraph.inlinks) with the
+    values of the blocks before it already replaced. The rank of pages
+    without links is kept as a running total so it stays current too.
+    A sweep does not keep the total rank at 1, so it is rescaled at the
+    end, which removes most of the remaining error in one go.
+    """
+    n = len(graph)
+    offsets, sources, weights = graph.inlinks()
+    dangling = graph.out_degrees() == 0
+    rank = rank.copy()
+    dangling_rank = rank[dangling].sum()
+    bounds = np.linspace(0, n, min(n, GAUSS_SEIDEL_BLOCKS) + 1).astype(np.int64)
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        received = received_by(offsets, sources, weights, rank, start, end)
+        new_rank = (1 - damping_factor) / n + damping_factor * (received + dangling_rank / n)
+        dangling_rank += (new_rank - rank[start:end])[dangling[start:end]].sum()
+        rank[start:end] = new_rank
+    return rank / rank.sum()
+
+
+def received_by(offsets, sources, weights, rank, start, end):
+    """
+    Return the rank pages start to end receive over their links, from
+    LinkGraph.inlinks style arrays.
+    """
+    links = slice(offsets[start], offsets[end])
+    targets = np.repeat(np.arange(end - start), np.diff(offsets[start:end + 1]))
+    return np.bincount(targets, weights=rank[sources[links]] * weights[links],
+                       minlength=end - start)
+
+
+def partitioned_iteration(graph, damping_factor, tolerance, workers=None, criterion="l1"):
+    """
+    Return the PageRank vector of a LinkGraph as a Convergence, computed
+    by a pool of `workers` processes (one per core by default).
+
+    The pages are split into one block per worker with about as many
+    links into each. The links grouped by target (LinkGraph.inlinks) and
+    two rank vectors are copied once into shared memory, so each worker
+    reads the ranks its block's links come from in place and writes its
+    block of the next step into the other vector. Only the change and
+    the rank on pages without links of each block go back through the
+    pool per step. Stops as power_iteration does.
+    """
+    if criterion not in CRITERIA:
+        raise ValueError(f"unknown criterion: {criterion}")
+    start = time.perf_counter()
+    n = len(graph)
+    workers = workers or os.cpu_count()
+    offsets, sources, weights = graph.inlinks()
+    dangling = graph.out_degrees() == 0
+    rank = np.full((2, n), 1 / n)
+
+    # Block edges split pages plus links into equal shares
+    work = offsets[:-1] + np.arange(n)
+    bounds = np.searchsorted(work, np.linspace(0, offsets[-1] + n, workers + 1))
+    bounds[-1] = n
+    blocks = [(int(a), int(b)) for a, b in zip(bounds[:-1], bounds[1:]) if a < b]
+
+    shared = {
+        "offsets": offsets, "sources": sources, "weights": weights,
+        "dangling": dangling, "rank": rank
+    }
+    memory = {name: SharedMemory(create=True, size=max(1, array.nbytes))
+              for name, array in shared.items()}
+    try:
+        layout = {}
+        for name, array in shared.items():
+            np.ndarray(array.shape, array.dtype, buffer=memory[name].buf)[...] = array
+            layout[name] = (memory[name].name, array.shape, array.dtype.str)
+        solution = Convergence(None, criterion, None)
+        dangling_rank = rank[0][dangling].sum()
+        with multiprocessing.Pool(len(blocks), initializer=attach_partition,
+                                  initargs=(layout,)) as pool:
+            while not solution.converged:
+                current = solution.iterations % 2
+                jobs = [(a, b, current, damping_factor, dangling_rank) for a, b in blocks]
+                results = pool.map(step_partition, jobs)
+                l1 = sum(result[0] for result in results)
+                largest = max(result[1] for result in results)
+                dangling_rank = sum(result[2] for result in results)
+                solution.iterations += 1
+                solution.residuals.append(float(l1))
+                solution.converged = (l1 if criterion == "l1" else largest) < tolerance
+                solution.seconds = time.perf_counter() - start
+                if solve_hook is not None:
+                    solve_hook(solution)
+        final = np.ndarray(rank.shape, rank.dtype, buffer=memory["rank"].buf)
+        solution.rank = final[solution.iterations % 2].copy()
+        del final
+    finally:
+        for block in memory.values():
+            block.close()
+            block.unlink()
+    return solution
+
+
+def attach_partition(layout):
+    global partition
+
+    memory = {name: SharedMemory(name=block) for name, (block, _, _) in layout.items()}
+    partition = {
+        name: np.ndarray(shape, dtype, buffer=memory[name].buf)
+        for name, (_, shape, dtype) in layout.items()
+    }
+    # Kept so the shared memory stays mapped as long as the arrays
+    partition["memory"] = memory
+
+
+def step_partition(job):
+    start, end, current, damping_factor, dangling_rank = job
+    rank = partition["rank"][current]
+    n = len(rank)
+    received = received_by(partition["offsets"], partition["sources"], partition["weights"],
+                           rank, start, end)
+    new_rank = (1 - damping_factor) / n + damping_factor * (received + dangling_rank / n)
+    change = np.abs(new_rank - rank[start:end])
+    partition["rank"][1 - current][start:end] = new_rank
+    return change.sum(), change.max(), new_rank[partition["dangling"][start:end]].sum()
+
+
+def update_pagerank(corpus, ranks, changes, damping_factor, tolerance=TOLERANCE):
+    """
+    Re-rank a corpus after a recrawl without solving from scratch.
+
+    `corpus` and `ranks` are the previous crawl and its PageRank values.
+    `changes` maps every page that was added or whose links changed to
+    its new links, and every removed page to None (see crawl_diff).
+
+    `corpus` may also be the previous crawl's LinkGraph, which is then
+    patched rather than rebuilt (see LinkGraph.patched) and returned in
+    place of the new corpus; keeping the graph between updates makes the
+    work follow the size of the change rather than of the corpus.
+
+    Return (new corpus, new PageRank dictionary). Ranking starts from the
+    previous values and only pushes rank out of pages whose values are
+    off; see push_pagerank.
+    """
+    if isinstance(corpus, LinkGraph):
+        graph = corpus.patched(changes)
+        corpus = graph
+    else:
+        corpus = dict(corpus)
+        for page, links in changes.items():
+            if links is None:
+                corpus.pop(page, None)
+            else:
+                corpus[page] = set(links)
+
+        # Like a crawl, only keep links to pages that are still in the corpus
+        removed = {page for page, links in changes.items() if links is None}
+        if removed:
+            corpus = {
+                page: links if removed.isdisjoint(links) else links - removed
+                for page, links in corpus.items()
+            }
+        graph = LinkGraph.from_corpus(corpus)
+
+    rank = np.fromiter(map(ranks.get, graph.pages, itertools.repeat(1 / len(graph))),
+                       dtype=float, count=len(graph))
+    rank /= rank.sum()
+    return corpus, graph.ranks(push_pagerank(graph, rank, damping_factor, tolerance))
+
+
+def crawl_diff(old, new):
+    """
+    Return the changes between two `crawl` results, as taken by
+    update_pagerank.
+    """
+    changes = {page: links for page, links in new.items() if old.get(page) != links}
+    changes.update({page: None for page in old if page not in new})
+    return changes
+
+
+def push_pagerank(graph, rank, damping_factor, tolerance):
+    """
+    Refine an approximate PageRank vector of a LinkGraph by pushing
+    residuals.
+
+    The residual r = (1 - d) / n + d P x - x says how far each page is
+    from satisfying the PageRank equation. Pushing a page moves its
+    residual into its rank and hands d times it on to the pages it links
+    to, so when only a few pages are off, only pages near them do any
+    work. Pages without links hand theirs to everyone, which is kept as
+    one shared term.
+
+    Pages with a residual above PUSH_THRESHOLD * tolerance / n are pushed
+    together in rounds, each one bincount over just their links. A ranking
+    solved to `tolerance` is already off by about tolerance / n on every
+    page, so a lower threshold would push the whole graph from the start.
+    Once more than PUSH_FRACTION of the pages or none are above it, or the
+    shared term gets large, x + r is exactly the next power iteration
+    step, so power_iteration takes over from there. Stops as soon as the
+    L1 norm of the residual, which is the change the next power iteration
+    step would make, is below `tolerance`.
+    """
+    n = len(graph)
+    threshold = PUSH_THRESHOLD * tolerance / n
+    out_degrees = graph.out_degrees()
+    rank = rank.copy()
+    residual = (1 - damping_factor) / n + damping_factor * graph.spread(rank) - rank
+    # Residual owed to every page by pushes from pages without links
+    shared = 0
+
+    total = np.abs(residual).sum()
+    while total + n * abs(shared) >= tolerance:
+        active = np.flatnonzero(np.abs(residual) > threshold)
+        if len(active) == 0 or len(active) > n * PUSH_FRACTION or n * abs(shared) > tolerance:
+            return power_iteration(graph, damping_factor, tolerance,
+                                   rank=rank + residual + shared).rank
+
+        values = residual[active]
+        residual[active] = 0
+        rank[active] += values
+        degrees = out_degrees[active]
+        shared += damping_factor * values[degrees == 0].sum() / n
+
+        # Positions of the active pages' links in `targets`, run by run
+        starts = np.repeat(graph.offsets[active] - np.cumsum(degrees) + degrees, degrees)
+        links = graph.targets[starts + np.arange(len(starts))]
+        shares = np.repeat(damping_factor * values[degrees > 0] / degrees[degrees > 0],
+                           degrees[degrees > 0])
+        residual += np.bincount(links, weights=shares, minlength=n)
+        total = np.abs(residual).sum()
+
+    rank += shared
+    return rank / rank.sum()
+
+
+def personalized_pagerank(corpus, seeds, damping_factor, tolerance=TOLERANCE, engine="block"):
+    """
+    Return personalized PageRank values for each seed set in `seeds`.
+
+    A seed set is a collection of pages, or a dictionary of page ->
+    weight, that the surfer jumps back to instead of a random page: with
+    probability `1 - damping_factor`, and from pages with no links. A seed
+    set of every page gives the ordinary PageRank.
+
+    `engine` picks the solver: "block" solves SEED_BLOCK seed sets at a
+    time by blocked power iteration and returns a value for every page;
+    "push" and "walk" approximate each seed set on its own, see
+    `forward_push` and `seed_walks`, and only return the pages they reach.
+
+    Return a list of dictionaries of page -> value, one per seed set.
+    """
+    graph = corpus if isinstance(corpus, LinkGraph) else LinkGraph.from_corpus(corpus)
+    if engine == "push":
+        return [forward_push(graph, seed_weights(graph, seed), damping_factor, tolerance)
+                for seed in seeds]
+    if engine == "walk":
+        return [seed_walks(graph, seed_weights(graph, seed), damping_factor, SAMPLES)
+                for seed in seeds]
+    if engine != "block":
+        raise ValueError(f"unknown engine: {engine}")
+
+    seeds = list(seeds)
+    results = []
+    for start in range(0, len(seeds), SEED_BLOCK):
+        block = seeds[start:start + SEED_BLOCK]
+        teleport = np.zeros((len(block), len(graph)))
+        for row, seed in enumerate(block):
+            for page, weight in seed_weights(graph, seed).items():
+                teleport[row, page] = weight
+        rank = block_iteration(graph, teleport, damping_factor, tolerance)
+        results.extend(graph.ranks(row) for row in rank)
+    return results
+
+
+def seed_weights(graph, seed):
+    """
+    Return a seed set as a dictionary of page number -> weight, with
+    weights summing to 1.
+    """
+    if not isinstance(seed, Mapping):
+        seed = dict.fromkeys(seed, 1)
+    total = sum(seed.values())
+    if not total > 0:
+        raise ValueError("seed set has no weight")
+    return {graph.index(page): weight / total for page, weight in seed.items()}
+
+
+def block_iteration(graph, teleport, damping_factor, tolerance):
+    """
+    Return the personalized PageRank vectors of a LinkGraph for every
+    row of the `teleport` matrix, as the rows of one matrix.
+
+    The rows step together, each step one sparse matrix product over the
+    whole block (see LinkGraph.follow), and each row drops out of the
+    block once its L1 change between steps is below `tolerance`. The
+    block is held with one column per row, so the product reads it in
+    place.
+    """
+    dangling = (graph.out_degrees() == 0).astype(float)
+    rank = np.empty((len(graph), len(teleport)))
+    columns = np.arange(len(teleport))
+    jump = np.ascontiguousarray(teleport.T)
+    current = jump.copy()
+    while len(columns):
+        received = graph.follow(current.T).T + jump * (dangling @ current)
+        new_rank = (1 - damping_factor) * jump + damping_factor * received
+        done = np.abs(new_rank - current).sum(axis=0) < tolerance
+        current = new_rank
+        if done.any():
+            rank[:, columns[done]] = current[:, done]
+            columns = columns[~done]
+            current = current[:, ~done]
+            jump = jump[:, ~done]
+    return rank.T
+
+
+def forward_push(graph, seed, damping_factor, tolerance):
+    """
+    Approximate the personalized PageRank of one seed set by forward
+    push, touching only pages near the seeds.
+
+    Each page holds an estimate and a residual, starting with the seed
+    weights as residual. Pushing a page keeps `1 - damping_factor` of its
+    residual as estimate and hands the rest on over its links, or back to
+    the seeds if it has none. Pages whose residual exceeds `tolerance`
+    times their number of links are pushed, in first-in first-out order,
+    so the work depends on `tolerance` and not the size of the graph.
+    The estimates fall short of the true values by the leftover residual.
+
+    Return a dictionary of page -> estimate for the pages reached.
+    """
+    out_degrees = graph.out_degrees()
+    thresholds = tolerance * np.maximum(out_degrees, 1)
+    seeds = np.fromiter(seed, dtype=np.int64, count=len(seed))
+    weights = np.fromiter(seed.values(), dtype=float, count=len(seed))
+    estimate = np.zeros(len(graph))
+    residual = np.zeros(len(graph))
+    residual[seeds] = weights
+
+    queue = deque(seeds[residual[seeds] > thresholds[seeds]].tolist())
+    queued = np.zeros(len(graph), dtype=bool)
+    queued[queue] = True
+    while queue:
+        page = queue.popleft()
+        queued[page] = False
+        value = residual[page]
+        residual[page] = 0
+        estimate[page] += (1 - damping_factor) * value
+        if out_degrees[page] == 0:
+            links = seeds
+            residual[links] += damping_factor * value * weights
+        else:
+            links = graph.targets[graph.offsets[page]:graph.offsets[page + 1]]
+            residual[links] += damping_factor * value / out_degrees[page]
+        for link in links[(residual[links] > thresholds[links]) & ~queued[links]].tolist():
+            queued[link] = True
+            queue.append(link)
+
+    reached = np.flatnonzero(estimate)
+    return {graph.pages[page]: float(estimate[page]) for page in reached.tolist()}
+
+
+def seed_walks(graph, seed, damping_factor, n, rng=None):
+    """
+    Approximate the personalized PageRank of one seed set by `n` random
+    walks, touching only pages near the seeds.
+
+    Walks start on pages drawn from the seed weights and stop at each
+    step with probability `1 - damping_factor`; otherwise they follow a
+    random link, or jump back to the seeds from a page with no links.
+    The share of walks that stop on a page estimates its value.
+
+    Return a dictionary of page -> estimate for the pages walks stop on.
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    seeds = np.fromiter(seed, dtype=np.int64, count=len(seed))
+    weights = np.fromiter(seed.values(), dtype=float, count=len(seed))
+    out_degrees = graph.out_degrees()
+
+    stops = []
+    position = rng.choice(seeds, size=n, p=weights)
+    while len(position):
+        walking = rng.random(len(position)) < damping_factor
+        stops.append(position[~walking])
+        position = position[walking]
+        degree = out_degrees[position]
+        follow = degree > 0
+        link = graph.offsets[position[follow]] + (rng.random(follow.sum()) * degree[follow]).astype(np.int64)
+        position[follow] = graph.targets[link]
+        position[~follow] = rng.choice(seeds, size=(~follow).sum(), p=weights)
+
+    pages, counts = np.unique(np.concatenate(stops), return_counts=True)
+    return {graph.pages[page]: count / n for page, count in zip(pages.tolist(), counts.tolist())}
+
+
+def python_pagerank(corpus, damping_factor, tolerance, criterion="l1"):
+    """
+    Pure Python solver updating one page at a time, see iterate_pagerank.
+    A sweep's changes are measured by `criterion` as in power_iteration.
+    """
+    if criterion not in CRITERIA:
+        raise ValueError(f"unknown criterion: {criterion}")
     PageRanks = {}
     
     for page in corpus.keys():
@@ -129,14 +888,14 @@ def iterate_pagerank(corpus, damping_factor):
     inputs_dictionary = find_inputs(corpus)
     change = 1
     default_value = (1-damping_factor)/len(corpus)
-    while np.abs(change) > .00001:
-        changes = set()
+    while np.abs(change) > tolerance:
+        changes = []
         for page in PageRanks.keys():
-            weighted_value = calculate_weighted(inputs_dictionary[page], PageRanks, corpus)
+            weighted_value = calculate_weighted(inputs_dictionary.get(page, ()), PageRanks, corpus)
             page_rank = default_value + damping_factor*(weighted_value)
-            changes.add(PageRanks[page]-page_rank)
+            changes.append(abs(PageRanks[page]-page_rank))
             PageRanks[page] = page_rank
-        change = max(changes)
+        change = sum(changes) if criterion == "l1" else max(changes)
     return PageRanks
 
 def find_inputs(corpus): # {a:(c, b), b:(a), c(b)} -> {a:(b), b:(c,a), c:(a)}